@@ -0,0 +1,138 @@
+import threading
+import logging
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Alert levels, as in the alert system's AlertLevel
+LEVELS = np.array(["NONE", "INFO", "MILD", "ESCALATION"], dtype=object)
+NONE, INFO, MILD, ESCALATION = 0, 1, 2, 3
+
+# metric -> (rule, escalation margin below low, escalation margin above high),
+# as in healthLogicService.assessSingleDataPointRiskOnServer:
+#   "range": MILD outside [low, high], ESCALATION beyond the margins
+#   "low":   MILD below low, ESCALATION more than the margin below it
+#   "info":  INFO when 0 < value < low
+#   None:    never alerts
+RULES = {
+    "GLUCOSE": ("range", 20, 70),
+    "HEART_RATE": ("range", 15, 25),
+    "SPO2": ("low", 5, None),
+    "SLEEP_HOURS": ("info", None, None),
+    "ACTIVITY_MINUTES": (None, None, None),
+}
+
+
+class ThresholdTable:
+    """Every user's current low/high thresholds in dense arrays.
+
+    Row per user (``user_index``), column per metric; NaN where a user has
+    no threshold for a metric. Rows are appended as users appear and the
+    arrays grow by doubling, so lookups are plain fancy indexing.
+    """
+
+    def __init__(self, metrics, capacity=1024):
+        self.metrics = list(metrics)
+        self.metric_index = {metric: i for i, metric in enumerate(self.metrics)}
+        self.user_index = {}
+        self.low = np.full((capacity, len(self.metrics)), np.nan)
+        self.high = np.full((capacity, len(self.metrics)), np.nan)
+        self.allow_escalation = np.ones(capacity, dtype=bool)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.user_index)
+
+    def set_user(self, user_id, thresholds, allow_escalation=True):
+        """Replace a user's thresholds from a users-document ``thresholds`` dict."""
+        thresholds = thresholds or {}
+        with self._lock:
+            row = self.user_index.get(user_id)
+            if row is None:
+                row = self.user_index[user_id] = len(self.user_index)
+                if row >= len(self.low):
+                    self._grow()
+            for metric, col in self.metric_index.items():
+                bounds = thresholds.get(metric) or {}
+                self.low[row, col] = bounds.get("low", np.nan)
+                self.high[row, col] = bounds.get("high", np.nan)
+            self.allow_escalation[row] = allow_escalation
+
+    def set_user_document(self, user):
+        # Like the alert system's !allowAutoEscalation, a missing flag disallows
+        self.set_user(user["id"], user.get("thresholds"), bool(user.get("allowAutoEscalation")))
+
+    def _grow(self):
+        # New arrays, so snapshots taken by evaluate() stay consistent
+        size = len(self.low)
+        self.low = np.concatenate([self.low, np.full_like(self.low, np.nan)])
+        self.high = np.concatenate([self.high, np.full_like(self.high, np.nan)])
+        self.allow_escalation = np.concatenate([self.allow_escalation, np.ones(size, dtype=bool)])
+
+    def snapshot(self):
+        with self._lock:
+            return self.low, self.high, self.allow_escalation
+
+    def rows(self, user_ids):
+        """Row per user id, -1 for users not in the table."""
+        index = self.user_index
+        return np.fromiter((index.get(user_id, -1) for user_id in user_ids), dtype=np.intp, count=len(user_ids))
+
+    def columns(self, metrics):
+        index = self.metric_index
+        return np.fromiter((index.get(metric, -1) for metric in metrics), dtype=np.intp, count=len(metrics))
+
+    def load(self, db):
+        for user in db.users.find({}, {"_id": 0, "id": 1, "thresholds": 1, "allowAutoEscalation": 1}).batch_size(10000):
+            self.set_user_document(user)
+        logger.info(f"Threshold table loaded: {len(self)} users")
+
+
+class AlertEngine:
+    """Evaluates batches of readings against a ThresholdTable in one NumPy pass."""
+
+    def __init__(self, metrics=RULES):
+        self.table = ThresholdTable(metrics)
+        rules = [RULES.get(metric, (None, None, None)) for metric in self.table.metrics]
+        self.checks_low = np.array([rule in ("range", "low") for rule, _, _ in rules])
+        self.checks_high = np.array([rule == "range" for rule, _, _ in rules])
+        self.checks_info = np.array([rule == "info" for rule, _, _ in rules])
+        self.low_margin = np.array([np.inf if m is None else m for _, m, _ in rules], dtype=np.float64)
+        self.high_margin = np.array([np.inf if m is None else m for _, _, m in rules], dtype=np.float64)
+
+    def unsupported(self, metrics):
+        """Metrics in ``metrics`` this engine has no rule for."""
+        return sorted(set(metrics) - set(self.table.metric_index))
+
+    def evaluate(self, user_ids, metrics, values):
+        """(levels, low, high) arrays aligned with the readings.
+
+        Levels are NONE/INFO/MILD/ESCALATION codes (see LEVELS), per metric
+        as in RULES; escalations are downgraded to MILD for users who
+        disallow auto-escalation. Readings for unknown users, or without a
+        threshold, get NONE and NaN bounds. Raises ValueError for metrics
+        without a rule, rather than reporting them as NONE.
+        """
+        unsupported = self.unsupported(metrics)
+        if unsupported:
+            raise ValueError(f"Unsupported metrics: {', '.join(unsupported)}")
+        values = np.asarray(values, dtype=np.float64)
+        rows = self.table.rows(user_ids)
+        cols = self.table.columns(metrics)
+        low_table, high_table, allow_escalation = self.table.snapshot()
+
+        known = rows >= 0
+        rows = np.where(known, rows, 0)
+        low = np.where(known, low_table[rows, cols], np.nan)
+        high = np.where(known, high_table[rows, cols], np.nan)
+
+        # NaN bounds compare False, so readings without a threshold never alert
+        checks_low, checks_high = self.checks_low[cols], self.checks_high[cols]
+        out_of_range = (checks_low & (values < low)) | (checks_high & (values > high))
+        escalate = (checks_low & (values < low - self.low_margin[cols])) | \
+                   (checks_high & (values > high + self.high_margin[cols]))
+        info = self.checks_info[cols] & (values < low) & (values > 0)
+        levels = np.where(out_of_range, MILD, np.where(info, INFO, NONE)).astype(np.int8)
+        levels[escalate & allow_escalation[rows]] = ESCALATION
+        return levels, low, high
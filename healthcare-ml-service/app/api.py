@@ -1,12 +1,200 @@
-from fastapi import FastAPI
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import numpy as np
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pymongo.errors import AutoReconnect, ConnectionFailure, ServerSelectionTimeoutError
 from .model_predictor import ModelPredictor
+from .schemas import (BatchThresholdRequest, ProfilingSettings, ReadingBatch,
+                      HealthReadingIngest, BehavioralLogIngest)
+from .indexes import ensure_indexes
+from .feature_cache import ChangeStreamInvalidator
+from .micro_batcher import MicroBatcher
+from .ingestion import IngestionBuffer
+from .alert_engine import AlertEngine, LEVELS
+from . import metrics
+from .metrics import REQUEST_SECONDS, PREDICTION_STAGE_SECONDS, RequestProfiler
+
+# Set up logging
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
 predictor = ModelPredictor()
 
-@app.get("/ml/personalized_thresholds")
-async def get_thresholds(userId: str, metric: str):
-    suggestion = predictor.predict(userId, metric)
+# Bulk reading evaluation against users' current thresholds (ALERT_ENGINE=true)
+alert_engine = AlertEngine()
+alert_engine_enabled = os.getenv("ALERT_ENGINE", "false").lower() == "true"
+# Without a change stream (standalone mongod) the threshold table is
+# reloaded this often instead; 0 disables
+alert_table_reload_seconds = float(os.getenv("ALERT_TABLE_RELOAD_SECONDS", "300"))
+
+# Concurrent single requests are scored together; MICRO_BATCH_WINDOW_MS=0
+# scores each request on its own
+batch_window_ms = float(os.getenv("MICRO_BATCH_WINDOW_MS", "2"))
+batcher = MicroBatcher(
+    predictor,
+    window_ms=batch_window_ms,
+    max_batch_size=int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+) if batch_window_ms > 0 else None
+
+# Buffered writes for /ingest/*; created at startup (INGESTION_ENABLED=false
+# turns the endpoints off)
+ingestion_enabled = os.getenv("INGESTION_ENABLED", "true").lower() == "true"
+ingestion = None
+invalidator = None
+startup_complete = False
+startup_error = None
+startup_task = None
+table_reloader = None
+
+# Startup steps failing on these are retried, backing off up to this many
+# seconds; any other error (a duplicate key on a unique index, bad
+# credentials) will not go away by waiting, so it crashes startup
+startup_retry_max_seconds = float(os.getenv("STARTUP_RETRY_MAX_SECONDS", "60"))
+TRANSIENT_ERRORS = (ConnectionFailure, ServerSelectionTimeoutError, AutoReconnect)
+
+async def _retry(name, step, *args):
+    """Run a blocking startup step in a thread until it succeeds or fails
+    with a non-transient error."""
+    global startup_error
+    delay = 1.0
+    while True:
+        try:
+            return await asyncio.to_thread(step, *args)
+        except TRANSIENT_ERRORS as e:
+            startup_error = f"{name}: {str(e)}"
+            logger.error(f"Startup step {name} failed, retrying in {delay:.0f}s: {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, startup_retry_max_seconds)
+
+async def start_models():
+    """Load every model, then follow registry promotions. Needs no Mongo;
+    the poller also retries models that failed to load here."""
+    await asyncio.to_thread(predictor.warm_up)
+    poll_seconds = float(os.getenv("MODEL_POLL_SECONDS", "60"))
+    if poll_seconds > 0:
+        predictor.start_model_poller(poll_seconds)
+
+async def reload_threshold_table(db):
+    """Keep the alert table current while the change stream is not running."""
+    while True:
+        await asyncio.sleep(alert_table_reload_seconds)
+        if invalidator is not None and invalidator.streaming:
+            continue
+        try:
+            await asyncio.to_thread(alert_engine.table.load, db)
+        except Exception as e:
+            logger.error(f"Threshold table reload failed: {str(e)}")
+
+async def start_data():
+    """Everything that needs Mongo, in order; /ready is 503 until done."""
+    global ingestion, invalidator, startup_complete, startup_error, table_reloader
+    await asyncio.to_thread(predictor.connect)
+    db = predictor.data_loader.db
+    if os.getenv("ENSURE_INDEXES", "false").lower() == "true":
+        await _retry("ensure_indexes", ensure_indexes, db)
+    store_mode = predictor.feature_mode == "store"
+    if store_mode:
+        await _retry("feature store load", predictor.feature_store.load, db, predictor.metric_models)
+    if alert_engine_enabled:
+        await _retry("threshold table load", alert_engine.table.load, db)
+    if store_mode or alert_engine_enabled or os.getenv("FEATURE_CACHE_CHANGE_STREAM", "false").lower() == "true":
+        invalidator = ChangeStreamInvalidator(
+            db, predictor.cache,
+            feature_store=predictor.feature_store if store_mode else None,
+            threshold_table=alert_engine.table if alert_engine_enabled else None
+        )
+        invalidator.start()
+    if alert_engine_enabled and alert_table_reload_seconds > 0:
+        table_reloader = asyncio.create_task(reload_threshold_table(db))
+    if ingestion_enabled:
+        ingestion = IngestionBuffer(
+            db, predictor.cache,
+            feature_store=predictor.feature_store if store_mode else None,
+            invalidator=invalidator,
+            batch_size=int(os.getenv("INGEST_BATCH_SIZE", "5000")),
+            flush_seconds=float(os.getenv("INGEST_FLUSH_MS", "1000")) / 1000,
+            max_pending=int(os.getenv("INGEST_MAX_PENDING", "100000"))
+        )
+        ingestion.start()
+    startup_complete = True
+    startup_error = None
+    logger.info("Startup complete")
+
+async def startup():
+    """Runs in the background so the process is live at once. Models and
+    Mongo-backed state start independently, so an unreachable Mongo does
+    not hold up model loading (or the other way round)."""
+    global startup_error
+    try:
+        await asyncio.gather(start_models(), start_data())
+    except Exception as e:
+        # Not retryable; /live fails so the process gets restarted
+        startup_error = str(e)
+        logger.error(f"Startup failed: {str(e)}")
+        raise
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global startup_task
+    startup_task = asyncio.create_task(startup())
+    # STARTUP_WAIT_SECONDS > 0 holds traffic until startup finishes (or the
+    # wait runs out) for deployments without a readiness check
+    wait_seconds = float(os.getenv("STARTUP_WAIT_SECONDS", "0"))
+    if wait_seconds > 0:
+        await asyncio.wait({startup_task}, timeout=wait_seconds)
+    yield
+    if not startup_task.done():
+        startup_task.cancel()
+    if table_reloader:
+        table_reloader.cancel()
+    if batcher:
+        batcher.close()
+    predictor.stop_model_poller()
+    if ingestion:
+        # Write what is still buffered before the client goes away
+        await asyncio.to_thread(ingestion.stop)
+    if invalidator:
+        invalidator.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+# Per-request stage breakdown for a sample of requests, adjustable at runtime
+# via /debug/profiling; PROFILING_SAMPLE_RATE sets the initial rate
+profiler = RequestProfiler(sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", "0")))
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    started = time.perf_counter()
+    token = profiler.start()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    # Unknown paths share one label so scrapes stay bounded
+    path = request.url.path if request.url.path in _route_paths else "other"
+    REQUEST_SECONDS.observe(elapsed, method=request.method, path=path)
+    if token is not None:
+        profiler.finish(token, request.method, path, response.status_code, elapsed)
+    return response
+
+def _cache_metrics():
+    stats = predictor.cache.stats()
+    return [
+        ("feature_cache_hits_total", "counter", "Feature cache hits", stats["hits"]),
+        ("feature_cache_misses_total", "counter", "Feature cache misses", stats["misses"]),
+        ("feature_cache_evictions_total", "counter", "Feature cache LRU evictions", stats["evictions"]),
+        ("feature_cache_invalidations_total", "counter", "Feature cache invalidated entries", stats["invalidations"]),
+        ("feature_cache_entries", "gauge", "Feature cache size", stats["size"]),
+        ("models_loaded", "gauge", "Metrics with a loaded model", len(predictor.models)),
+        ("ingest_pending_documents", "gauge", "Documents accepted but not yet written",
+         ingestion.pending if ingestion else 0),
+    ]
+
+metrics.register_collector(_cache_metrics)
+
+def _threshold_response(userId: str, metric: str, suggestion):
     return {
         "userId": userId,
         "metric": metric,
@@ -14,4 +202,111 @@ async def get_thresholds(userId: str, metric: str):
         "modelVersion": suggestion.modelVersion,
         "suggestionTimestamp": suggestion.suggestionTimestamp,
         "confidence": suggestion.confidence
-    }
\ No newline at end of file
+    }
+
+def _json(content):
+    with PREDICTION_STAGE_SECONDS.time(stage="serialization"):
+        return JSONResponse(jsonable_encoder(content))
+
+@app.get("/ml/personalized_thresholds")
+async def get_thresholds(userId: str, metric: str):
+    if batcher:
+        suggestion = await batcher.predict(userId, metric)
+    else:
+        suggestion = await predictor.predict_async(userId, metric)
+    return _json(_threshold_response(userId, metric, suggestion))
+
+@app.post("/ml/personalized_thresholds:batch")
+async def get_thresholds_batch(request: BatchThresholdRequest):
+    pairs = [(r.userId, r.metric) for r in request.requests]
+    suggestions = await predictor.predict_batch_async(pairs)
+    return _json({
+        "results": [
+            _threshold_response(userId, metric, suggestion)
+            for (userId, metric), suggestion in zip(pairs, suggestions)
+        ]
+    })
+
+@app.post("/alerts/evaluate")
+async def evaluate_readings(batch: ReadingBatch):
+    if not alert_engine_enabled:
+        raise HTTPException(status_code=503, detail="Alert engine disabled (set ALERT_ENGINE=true)")
+    unsupported = alert_engine.unsupported(batch.metrics)
+    if unsupported:
+        raise HTTPException(status_code=422, detail=f"No alert rule for metrics: {', '.join(unsupported)}")
+    # NumPy work and list conversion scale with the batch: keep them off the event loop
+    return _json(await asyncio.to_thread(_evaluate, batch))
+
+def _evaluate(batch):
+    levels, low, high = alert_engine.evaluate(batch.userIds, batch.metrics, batch.values)
+    return {
+        "levels": LEVELS[levels].tolist(),
+        "low": np.where(np.isnan(low), None, low).tolist(),
+        "high": np.where(np.isnan(high), None, high).tolist(),
+        # positions of readings that raised an alert
+        "alerts": np.flatnonzero(levels).tolist(),
+    }
+
+def _ingest(collection, docs):
+    if not ingestion_enabled:
+        raise HTTPException(status_code=503, detail="Ingestion disabled (set INGESTION_ENABLED=true)")
+    if ingestion is None:
+        raise HTTPException(status_code=503, detail="Service starting", headers={"Retry-After": "1"})
+    if len(docs) > ingestion.max_pending:
+        # Would never fit, however long the client waits
+        raise HTTPException(status_code=413, detail=f"At most {ingestion.max_pending} documents per request")
+    if not ingestion.offer(collection, docs):
+        # Mongo is behind: shed load instead of buffering without bound
+        return JSONResponse(
+            {"detail": "Ingestion buffer full, retry later", "pending": ingestion.pending},
+            status_code=429, headers={"Retry-After": str(max(1, round(ingestion.flush_seconds)))}
+        )
+    return JSONResponse({"accepted": len(docs), "pending": ingestion.pending}, status_code=202)
+
+@app.post("/ingest/healthdata")
+async def ingest_healthdata(batch: HealthReadingIngest):
+    return _ingest("healthdata", [reading.model_dump(exclude_none=True) for reading in batch.readings])
+
+@app.post("/ingest/behaviorallogs")
+async def ingest_behaviorallogs(batch: BehavioralLogIngest):
+    return _ingest("behaviorallogs", [log.model_dump(exclude_none=True) for log in batch.logs])
+
+@app.get("/live")
+async def live():
+    # Liveness only: the event loop answers and startup has not crashed.
+    # Dependencies still coming up (retried) are /ready's job
+    if startup_task is not None and startup_task.done() and not startup_task.cancelled() \
+            and startup_task.exception() is not None:
+        return JSONResponse({"live": False, "startupError": startup_error}, status_code=503)
+    return {"live": True}
+
+@app.get("/ready")
+async def ready():
+    status = {
+        "ready": startup_complete and predictor.is_ready(),
+        "startupComplete": startup_complete,
+        "startupError": startup_error,
+        "models": predictor.model_status()
+    }
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/ml/cache/stats")
+async def get_cache_stats():
+    return predictor.cache.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profiling")
+async def get_profiling():
+    return {"sampleRate": profiler.sample_rate, "recent": list(profiler.recent)}
+
+@app.post("/debug/profiling")
+async def set_profiling(settings: ProfilingSettings):
+    profiler.sample_rate = settings.sampleRate
+    if settings.clear:
+        profiler.recent.clear()
+    return {"sampleRate": profiler.sample_rate}
+
+_route_paths = {route.path for route in app.routes}
\ No newline at end of file
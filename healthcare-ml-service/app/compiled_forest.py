@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import numpy as np
+
+_ARRAYS = ("left", "right", "feature", "threshold", "value", "roots")
+
+
+class CompiledForest:
+    """Array-backed export of a fitted sklearn tree ensemble for fast scoring.
+
+    All trees are flattened into shared node arrays and every (row, tree)
+    pair is walked in lockstep: leaves point to themselves, so exactly
+    ``max_depth`` vectorized steps reach every leaf without branching.
+    Traversal writes into per-thread buffers that are reused across calls,
+    so steady-state scoring allocates only the returned array. Rows are
+    walked ``block_rows`` at a time, which caps the buffers at about
+    ``block_rows * n_trees * 50`` bytes per thread for any batch size.
+
+    Splits compare the float32-cast feature against the float64 threshold,
+    exactly like sklearn, so predictions match ``model.predict``. Trees fit
+    with missing-value support are not handled; features here are never NaN.
+    """
+
+    block_rows = 1024
+
+    def __init__(self, left, right, feature, threshold, value, roots, max_depth, n_features):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value          # (n_nodes, n_outputs)
+        self.roots = roots          # (n_trees,) global index of each tree's root
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self._local = threading.local()
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a RandomForest/ExtraTrees/DecisionTree regressor."""
+        if hasattr(model, "estimators_"):
+            trees = [estimator.tree_ for estimator in model.estimators_]
+        elif hasattr(model, "tree_"):
+            trees = [model.tree_]
+        else:
+            raise TypeError(f"Cannot compile {type(model).__name__}: not a tree ensemble")
+
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            nodes = np.arange(tree.node_count, dtype=np.intp) + offset
+            is_leaf = tree.children_left == -1
+            # Leaves loop back to themselves and always "go left"
+            lefts.append(np.where(is_leaf, nodes, tree.children_left + offset))
+            rights.append(np.where(is_leaf, nodes, tree.children_right + offset))
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            values.append(tree.value.reshape(tree.node_count, -1))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max(tree.max_depth for tree in trees),
+            n_features=model.n_features_in_,
+        )
+
+    @property
+    def n_outputs(self):
+        return self.value.shape[1]
+
+    def predict(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows = X.shape[0]
+        out = np.empty((n_rows, self.n_outputs), dtype=np.float64)
+        # Large batches go through the same buffers block by block, so
+        # scratch memory is bounded by block_rows whatever the batch size
+        buffers = self._buffers()
+        for start in range(0, n_rows, self.block_rows):
+            stop = min(start + self.block_rows, n_rows)
+            block = buffers if stop - start == len(buffers["x"]) else self._views(buffers, stop - start)
+            self._predict_block(X[start:stop], block, out[start:stop])
+        return out[:, 0] if self.n_outputs == 1 else out
+
+    def _predict_block(self, X, buffers, out):
+        np.copyto(buffers["x"], X, casting="same_kind")
+
+        nodes, spare = buffers["nodes"], buffers["spare"]
+        np.copyto(nodes, self.roots)
+        for _ in range(self.max_depth):
+            np.take(self.feature, nodes, out=buffers["index"])
+            buffers["index"] += buffers["row_offsets"]
+            np.take(buffers["x_flat"], buffers["index"], out=buffers["x_values"])
+            np.take(self.threshold, nodes, out=buffers["thresholds"])
+            np.less_equal(buffers["x_values"], buffers["thresholds"], out=buffers["go_left"])
+            np.take(self.right, nodes, out=spare)
+            np.take(self.left, nodes, out=buffers["index"])
+            np.copyto(spare, buffers["index"], where=buffers["go_left"])
+            nodes, spare = spare, nodes
+
+        np.take(self.value, nodes, axis=0, out=buffers["leaf_values"])
+        np.mean(buffers["leaf_values"], axis=1, out=out)
+
+    @staticmethod
+    def _views(buffers, n_rows):
+        """The first n_rows rows of every buffer, for blocks smaller than block_rows."""
+        views = {name: buffer[:n_rows] for name, buffer in buffers.items() if name != "x_flat"}
+        views["x_flat"] = views["x"].reshape(-1)
+        return views
+
+    def _buffers(self):
+        # Always block_rows deep, so mixed batch sizes never reallocate
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            n_rows = self.block_rows
+            n_trees = len(self.roots)
+            x = np.empty((n_rows, self.n_features), dtype=np.float32)
+            buffers = {
+                "x": x,
+                "x_flat": x.reshape(-1),
+                "row_offsets": (np.arange(n_rows, dtype=np.intp) * self.n_features)[:, None],
+                "nodes": np.empty((n_rows, n_trees), dtype=np.intp),
+                "spare": np.empty((n_rows, n_trees), dtype=np.intp),
+                "index": np.empty((n_rows, n_trees), dtype=np.intp),
+                "x_values": np.empty((n_rows, n_trees), dtype=np.float32),
+                "thresholds": np.empty((n_rows, n_trees), dtype=np.float64),
+                "go_left": np.empty((n_rows, n_trees), dtype=bool),
+                "leaf_values": np.empty((n_rows, n_trees, self.n_outputs), dtype=np.float64),
+            }
+            self._local.buffers = buffers
+        return buffers
+
+    def save(self, directory):
+        """Write one .npy per array so load() can memory-map them."""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"max_depth": self.max_depth, "n_features": self.n_features}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in _ARRAYS
+        }
+        return cls(**arrays, **meta)
@@ -1,45 +1,264 @@
 import os
-from pymongo import MongoClient
+import asyncio
+from pymongo import MongoClient, AsyncMongoClient
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from collections import defaultdict
 import logging
+from .metrics import MONGO_QUERY_SECONDS
+from .feature_store import window_start_ms
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+def client_options():
+    """Pool bounds and timeouts for each client, per worker process.
+
+    Every worker has its own sync and async client, so N workers can open
+    up to 2 x N x MONGO_MAX_POOL_SIZE connections. MONGO_TIMEOUT_MS bounds
+    connecting and server selection (pymongo waits 30s by default).
+    """
+    timeout_ms = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "connectTimeoutMS": timeout_ms,
+        "serverSelectionTimeoutMS": timeout_ms,
+    }
+
 class MongoDBLoader:
     def __init__(self):
         mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
         logger.info(f"Connecting to MongoDB at: {mongo_uri}")
-        self.client = MongoClient(mongo_uri)
+        self.client = MongoClient(mongo_uri, **client_options())
         self.db = self.client["healthcompanion"]
         logger.info(f"Connected to database: healthcompanion")
-    
+
+    @MONGO_QUERY_SECONDS.time(query="user")
     def get_user_data(self, user_id: str):
         return self.db.users.find_one({"id": user_id})
-    
+
+    @MONGO_QUERY_SECONDS.time(query="health_data")
     def get_health_data(self, user_id: str, metric: str, days=30):
-        cutoff = datetime.now() - timedelta(days=days)
-        return list(self.db.healthdata.find({
-            "userId": user_id,
-            "type": metric,
-            "timestamp": {"$gte": cutoff.timestamp() * 1000}
-        }))
-    
+        return list(self.db.healthdata.find(_health_data_filter(user_id, metric, days)))
+
+    @MONGO_QUERY_SECONDS.time(query="behavioral_logs")
     def get_behavioral_logs(self, user_id: str, days=30):
-        cutoff = datetime.now() - timedelta(days=days)
-        return list(self.db.behaviorallogs.find({
-            "userId": user_id,
-            "timestamp": {"$gte": cutoff.timestamp() * 1000}
-        }))
-    
+        return list(self.db.behaviorallogs.find(_behavioral_logs_filter(user_id, days)))
+
+    @MONGO_QUERY_SECONDS.time(query="alert_feedback")
     def get_alert_feedback(self, user_id: str, metric: str, days=90):
-        cutoff = datetime.now() - timedelta(days=days)
-        return list(self.db.alerts.find({
-            "userId": user_id,
-            "metricType": metric,
-            "userFeedback": {"$exists": True},
-            "timestamp": {"$gte": cutoff.timestamp() * 1000}
-        }))
\ No newline at end of file
+        return list(self.db.alerts.find(_alert_feedback_filter(user_id, metric, days)))
+
+    # Batch variants: one $in query per collection, grouped by userId
+
+    @MONGO_QUERY_SECONDS.time(query="users_batch")
+    def get_users_data(self, user_ids):
+        return {u["id"]: u for u in self.db.users.find({"id": {"$in": list(user_ids)}})}
+
+    @MONGO_QUERY_SECONDS.time(query="health_data_batch")
+    def get_health_data_for_users(self, user_ids, metric: str, days=30):
+        return _group_by_user(self.db.healthdata.find(
+            _health_data_filter({"$in": list(user_ids)}, metric, days)
+        ))
+
+    @MONGO_QUERY_SECONDS.time(query="behavioral_logs_batch")
+    def get_behavioral_logs_for_users(self, user_ids, days=30):
+        return _group_by_user(self.db.behaviorallogs.find(
+            _behavioral_logs_filter({"$in": list(user_ids)}, days)
+        ))
+
+    @MONGO_QUERY_SECONDS.time(query="alert_feedback_batch")
+    def get_alert_feedback_for_users(self, user_ids, metric: str, days=90):
+        return _group_by_user(self.db.alerts.find(
+            _alert_feedback_filter({"$in": list(user_ids)}, metric, days)
+        ))
+
+    # Feature-extraction mode: Mongo computes the aggregates, we get one small doc per user
+
+    @MONGO_QUERY_SECONDS.time(query="feature_document")
+    def get_feature_document(self, user_id: str, metric: str):
+        docs = list(self.db.users.aggregate(_feature_pipeline(user_id, metric)))
+        return docs[0] if docs else None
+
+    @MONGO_QUERY_SECONDS.time(query="feature_documents_batch")
+    def get_feature_documents(self, user_ids, metric: str):
+        pipeline = _feature_pipeline({"$in": list(user_ids)}, metric)
+        return {doc["userId"]: doc for doc in self.db.users.aggregate(pipeline)}
+
+    # Suggestions precomputed by training/score_all.py
+
+    @MONGO_QUERY_SECONDS.time(query="threshold_suggestion")
+    def get_threshold_suggestion(self, user_id: str, metric: str):
+        return self.db.thresholdsuggestions.find_one(_suggestion_filter(user_id, metric))
+
+    @MONGO_QUERY_SECONDS.time(query="threshold_suggestions_batch")
+    def get_threshold_suggestions(self, user_ids, metric: str):
+        return {
+            doc["userId"]: doc
+            for doc in self.db.thresholdsuggestions.find(_suggestion_filter({"$in": list(user_ids)}, metric))
+        }
+
+
+class AsyncMongoDBLoader:
+    """Non-blocking counterpart of MongoDBLoader for the API's event loop."""
+
+    def __init__(self):
+        mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+        logger.info(f"Connecting (async) to MongoDB at: {mongo_uri}")
+        self.client = AsyncMongoClient(mongo_uri, **client_options())
+        self.db = self.client["healthcompanion"]
+
+    @MONGO_QUERY_SECONDS.time(query="user")
+    async def get_user_data(self, user_id: str):
+        return await self.db.users.find_one({"id": user_id})
+
+    @MONGO_QUERY_SECONDS.time(query="health_data")
+    async def get_health_data(self, user_id: str, metric: str, days=30):
+        return await self.db.healthdata.find(_health_data_filter(user_id, metric, days)).to_list(None)
+
+    @MONGO_QUERY_SECONDS.time(query="behavioral_logs")
+    async def get_behavioral_logs(self, user_id: str, days=30):
+        return await self.db.behaviorallogs.find(_behavioral_logs_filter(user_id, days)).to_list(None)
+
+    @MONGO_QUERY_SECONDS.time(query="alert_feedback")
+    async def get_alert_feedback(self, user_id: str, metric: str, days=90):
+        return await self.db.alerts.find(_alert_feedback_filter(user_id, metric, days)).to_list(None)
+
+    @MONGO_QUERY_SECONDS.time(query="feature_document")
+    async def get_feature_document(self, user_id: str, metric: str):
+        cursor = await self.db.users.aggregate(_feature_pipeline(user_id, metric))
+        docs = await cursor.to_list(1)
+        return docs[0] if docs else None
+
+    @MONGO_QUERY_SECONDS.time(query="threshold_suggestion")
+    async def get_threshold_suggestion(self, user_id: str, metric: str):
+        return await self.db.thresholdsuggestions.find_one(_suggestion_filter(user_id, metric))
+
+    async def get_prediction_inputs(self, user_id: str, metric: str):
+        """Run the four per-prediction queries concurrently.
+
+        Returns (user_data, health_data, behavioral_logs, alerts).
+        """
+        return await asyncio.gather(
+            self.get_user_data(user_id),
+            self.get_health_data(user_id, metric),
+            self.get_behavioral_logs(user_id),
+            self.get_alert_feedback(user_id, metric),
+        )
+
+
+def loader_queries(user_id: str, metric: str):
+    """(collection, filter) for every find() the loaders issue, single and batch.
+
+    Used by ``app.indexes`` to explain each access pattern.
+    """
+    batch_ids = {"$in": [user_id]}
+    return [
+        ("users", {"id": user_id}),
+        ("users", {"id": batch_ids}),
+        ("healthdata", _health_data_filter(user_id, metric, 30)),
+        ("healthdata", _health_data_filter(batch_ids, metric, 30)),
+        ("behaviorallogs", _behavioral_logs_filter(user_id, 30)),
+        ("behaviorallogs", _behavioral_logs_filter(batch_ids, 30)),
+        ("alerts", _alert_feedback_filter(user_id, metric, 90)),
+        ("alerts", _alert_feedback_filter(batch_ids, metric, 90)),
+        ("thresholdsuggestions", _suggestion_filter(user_id, metric)),
+        ("thresholdsuggestions", _suggestion_filter(batch_ids, metric)),
+    ]
+
+def _cutoff_ms(days):
+    # Whole-day windows, as in RollingFeatureStore and the training builder,
+    # so every data-source mode computes the same features
+    return window_start_ms(days)
+
+def _health_data_filter(user_id, metric, days):
+    return {
+        "userId": user_id,
+        "type": metric,
+        "timestamp": {"$gte": _cutoff_ms(days)}
+    }
+
+def _behavioral_logs_filter(user_id, days):
+    return {
+        "userId": user_id,
+        "timestamp": {"$gte": _cutoff_ms(days)}
+    }
+
+def _alert_feedback_filter(user_id, metric, days):
+    return {
+        "userId": user_id,
+        "metricType": metric,
+        "userFeedback": {"$exists": True},
+        "timestamp": {"$gte": _cutoff_ms(days)}
+    }
+
+def _suggestion_filter(user_id, metric):
+    return {"userId": user_id, "metric": metric}
+
+def _feature_pipeline(user_match, metric, health_days=30, logs_days=30, alert_days=90):
+    """Aggregation on ``users`` that returns one feature document per user.
+
+    Each $lookup joins on userId and reduces the matching documents to a
+    single $group row inside Mongo, so only the aggregates cross the wire:
+    ``{userId, age, mean, std, count, false_alarms, high_carb_meals,
+    stress_events}``. Windows match the document-mode queries above.
+    The $lookup localField/foreignField + pipeline form needs MongoDB 5.0+.
+    """
+    return [
+        {"$match": {"id": user_match}},
+        {"$project": {"_id": 0, "id": 1, "age": 1}},
+        _lookup_stats("healthdata", _health_data_filter(None, metric, health_days),
+                      ["value"], "health", {
+            "mean": {"$avg": "$value"},
+            "std": {"$stdDevPop": "$value"},
+            "count": {"$sum": 1},
+        }),
+        _lookup_stats("behaviorallogs", _behavioral_logs_filter(None, logs_days),
+                      ["dietType", "moodType"], "logs", {
+            "high_carb_meals": _count_if("$dietType", "High Carb Meal"),
+            "stress_events": _count_if("$moodType", "Stressed"),
+        }),
+        _lookup_stats("alerts", _alert_feedback_filter(None, metric, alert_days),
+                      ["userFeedback"], "alerts", {
+            "false_alarms": _count_if("$userFeedback", "DISMISSED_FALSE_ALARM"),
+        }),
+        {"$project": {
+            "userId": "$id",
+            "age": {"$ifNull": ["$age", 50]},
+            "mean": _stat_or_zero("health", "mean"),
+            "std": _stat_or_zero("health", "std"),
+            "count": _stat_or_zero("health", "count"),
+            "false_alarms": _stat_or_zero("alerts", "false_alarms"),
+            "high_carb_meals": _stat_or_zero("logs", "high_carb_meals"),
+            "stress_events": _stat_or_zero("logs", "stress_events"),
+        }},
+    ]
+
+def _lookup_stats(collection, match, fields, as_field, accumulators):
+    # userId comes from the join, not from the filter
+    match = {k: v for k, v in match.items() if k != "userId"}
+    return {"$lookup": {
+        "from": collection,
+        "localField": "id",
+        "foreignField": "userId",
+        "pipeline": [
+            {"$match": match},
+            {"$project": {"_id": 0, **{field: 1 for field in fields}}},
+            {"$group": {"_id": None, **accumulators}},
+        ],
+        "as": as_field,
+    }}
+
+def _count_if(field, value):
+    return {"$sum": {"$cond": [{"$eq": [field, value]}, 1, 0]}}
+
+def _stat_or_zero(as_field, name):
+    return {"$ifNull": [{"$arrayElemAt": [f"${as_field}.{name}", 0]}, 0]}
+
+def _group_by_user(docs):
+    grouped = defaultdict(list)
+    for doc in docs:
+        grouped[doc["userId"]].append(doc)
+    return grouped
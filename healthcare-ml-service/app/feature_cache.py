@@ -0,0 +1,248 @@
+import threading
+import time
+import logging
+from collections import OrderedDict, namedtuple
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CachedPrediction = namedtuple("CachedPrediction", ["features", "suggestion"])
+
+
+class FeatureCache:
+    """Bounded LRU cache keyed by (userId, metric) with a per-entry TTL.
+
+    With ``remember_seconds`` > 0 it also remembers, for that long, when
+    each user/metric was last invalidated (new data arrived), so callers
+    can tell whether something computed elsewhere predates that data.
+
+    Thread-safe: the API event loop and the prediction pool both use it.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=900, clock=time.monotonic,
+                 remember_seconds=0, wall_clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.remember_seconds = remember_seconds
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._invalidated = OrderedDict()  # (userId, metric or None) -> wall time, oldest first
+        self._cleared_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, count_miss=True):
+        """Cached value or None. ``count_miss=False`` is for a first look
+        whose misses are looked up (and counted) again later."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id, metric=None):
+        """Drop one (user_id, metric) entry, or every entry for user_id."""
+        with self._lock:
+            if metric is not None:
+                keys = [(user_id, metric)] if (user_id, metric) in self._entries else []
+            else:
+                keys = [key for key in self._entries if key[0] == user_id]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            if self.remember_seconds > 0:
+                self._remember((user_id, metric))
+
+    def _remember(self, key):
+        now = self._wall_clock()
+        self._invalidated[key] = now
+        self._invalidated.move_to_end(key)
+        while self._invalidated and next(iter(self._invalidated.values())) < now - self.remember_seconds:
+            self._invalidated.popitem(last=False)
+
+    def invalidated_at(self, user_id, metric):
+        """Wall-clock time (epoch seconds) user_id's metric last got new data, 0 if not within remember_seconds."""
+        with self._lock:
+            return max(
+                self._invalidated.get((user_id, metric), 0.0),
+                self._invalidated.get((user_id, None), 0.0),
+                self._cleared_at,
+            )
+
+    def invalidate_metric(self, metric):
+        with self._lock:
+            keys = [key for key in self._entries if key[1] == metric]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            if self.remember_seconds > 0:
+                self._cleared_at = self._wall_clock()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class ChangeStreamInvalidator:
+    """Invalidates FeatureCache entries from a Mongo change stream.
+
+    Watches the collections that feed prediction features. When a
+    RollingFeatureStore is given, inserted documents (and alerts that gain
+    userFeedback) are also added to it; when a ThresholdTable is given,
+    inserted or updated users refresh their thresholds in it. Inserts this
+    process already added to the store itself (see IngestionBuffer) are
+    registered with ``skip_inserts`` and not added twice. Change streams need a replica set (a
+    single-node one is fine); on a standalone mongod the watcher logs a
+    warning and exits, leaving the TTL as the only expiry.
+    """
+
+    # collection -> document field holding the metric (None: affects every metric)
+    WATCHED = {"healthdata": "type", "alerts": "metricType", "behaviorallogs": None}
+
+    def __init__(self, db, cache, feature_store=None, threshold_table=None, retry_seconds=5,
+                 max_skipped=1000000):
+        self.db = db
+        self.cache = cache
+        self.feature_store = feature_store
+        self.threshold_table = threshold_table
+        self.retry_seconds = retry_seconds
+        self.max_skipped = max_skipped
+        self._skipped = OrderedDict()  # _id -> None, oldest first
+        self._skipped_lock = threading.Lock()
+        self._streaming = False  # a stream has opened and the watcher still runs
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def streaming(self):
+        """True while a change stream is open (or being resumed)."""
+        return self._streaming
+
+    def skip_inserts(self, ids):
+        """Don't add these inserted documents to the feature store when their events arrive.
+
+        A no-op unless the stream is being watched: otherwise no events come
+        to consume the entries.
+        """
+        with self._skipped_lock:
+            if not self._streaming:
+                return
+            for _id in ids:
+                self._skipped[_id] = None
+            # Bounded in case the events never come (e.g. the stream is down)
+            while len(self._skipped) > self.max_skipped:
+                self._skipped.popitem(last=False)
+
+    def _take_skipped(self, _id):
+        with self._skipped_lock:
+            return self._skipped.pop(_id, False) is None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="feature-cache-invalidator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.retry_seconds)
+
+    def _run(self):
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": {"$in": list(self.WATCHED)}},
+            {"ns.coll": "users", "operationType": {"$in": ["insert", "update", "replace"]}},
+        ]}}]
+        try:
+            self._watch(pipeline)
+        finally:
+            with self._skipped_lock:
+                self._streaming = False
+                self._skipped.clear()
+
+    def _watch(self, pipeline):
+        resume_token = None
+        while not self._stop.is_set():
+            try:
+                with self.db.watch(pipeline, full_document="updateLookup",
+                                   resume_after=resume_token, max_await_time_ms=1000) as stream:
+                    logger.info("Feature cache change stream started")
+                    # From here on, inserts are delivered (after errors too,
+                    # by resuming), so skipped ids will be consumed
+                    with self._skipped_lock:
+                        self._streaming = True
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self.handle_change(change)
+                            resume_token = stream.resume_token
+            except OperationFailure as e:
+                logger.warning(f"Change streams unavailable, feature cache relies on TTL only: {str(e)}")
+                return
+            except PyMongoError as e:
+                logger.error(f"Feature cache change stream error, retrying: {str(e)}")
+                self._stop.wait(self.retry_seconds)
+
+    def handle_change(self, change):
+        collection = change.get("ns", {}).get("coll")
+        if collection == "users":
+            # users only feed the feature store (age) and the threshold table
+            user = change.get("fullDocument")
+            if user:
+                if self.feature_store is not None:
+                    self.feature_store.ingest(collection, user)
+                if self.threshold_table is not None:
+                    self.threshold_table.set_user_document(user)
+            return
+        if collection not in self.WATCHED:
+            return
+        doc = change.get("fullDocument")
+        if not doc or "userId" not in doc:
+            # deletes (and updates to since-deleted docs) carry no userId
+            self.cache.clear()
+            return
+        if self.feature_store is not None and self._is_new_feature_input(change):
+            if not (change.get("operationType") == "insert" and self._take_skipped(doc.get("_id"))):
+                self.feature_store.ingest(collection, doc)
+        metric_field = self.WATCHED[collection]
+        self.cache.invalidate(doc["userId"], doc.get(metric_field) if metric_field else None)
+
+    def _is_new_feature_input(self, change):
+        if change.get("operationType") == "insert":
+            return True
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        return change.get("operationType") == "update" and "userFeedback" in updated
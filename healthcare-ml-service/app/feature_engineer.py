@@ -1,28 +1,84 @@
 # feature_engineer.py
+# Single definition of the threshold-model features, shared by the predictor,
+# the rolling feature store and the trainer.
+import math
+import numpy as np
+
+# Column order of the model input. Models are trained on exactly this order.
+FEATURE_NAMES = ["age", "mean", "std", "false_alarms", "high_carb_meals", "stress_events"]
+
+DEFAULT_AGE = 50
+
+# Category values counted by the behavioral/alert features
+HIGH_CARB_DIET = "High Carb Meal"
+STRESSED_MOOD = "Stressed"
+FALSE_ALARM_FEEDBACK = "DISMISSED_FALSE_ALARM"
+
 def create_features(user_data, health_data, behavioral_logs, alerts):
-    # Health metrics features
-    health_features = {
-        "glucose_mean": np.mean([d.value for d in health_data if d.type == "GLUCOSE"]),
-        "hr_std_dev": np.std([d.value for d in health_data if d.type == "HEART_RATE"]),
-        # Additional statistical features
+    """Features from raw Mongo documents (health data already filtered to one metric)."""
+    values = [d['value'] for d in health_data]
+    features = {
+        "age": user_data.get("age", DEFAULT_AGE),
+        "mean": np.mean(values) if values else 0,
+        "std": np.std(values) if len(values) > 1 else 0,
+        "false_alarms": 0,
+        "high_carb_meals": 0,
+        "stress_events": 0,
     }
-    
+    for log in behavioral_logs:
+        for name, count in behavioral_counts(log).items():
+            features[name] += count
+    for alert in alerts:
+        for name, count in alert_counts(alert).items():
+            features[name] += count
+    return features
+
+def behavioral_counts(log):
     # Behavioral features
-    behavioral_features = {
-        "high_carb_meals": sum(1 for log in behavioral_logs 
-                              if log.logType == "DIET" and log.dietType == "High Carb Meal"),
-        "stress_events": sum(1 for log in behavioral_logs 
-                            if log.logType == "MOOD" and log.moodType == "Stressed"),
-        # Additional behavioral metrics
+    return {
+        "high_carb_meals": int(log.get("dietType") == HIGH_CARB_DIET),
+        "stress_events": int(log.get("moodType") == STRESSED_MOOD),
     }
-    
+
+def alert_counts(alert):
     # Alert feedback features
-    alert_features = {
-        "false_alarms": sum(1 for alert in alerts 
-                          if alert.userFeedback == "DISMISSED_FALSE_ALARM"),
-        "acknowledged_alerts": sum(1 for alert in alerts 
-                                  if alert.userFeedback == "DISMISSED_ACKNOWLEDGED"),
-        # Additional alert metrics
+    return {
+        "false_alarms": int(alert.get("userFeedback") == FALSE_ALARM_FEEDBACK),
     }
-    
-    return {**health_features, **behavioral_features, **alert_features}
\ No newline at end of file
+
+def features_from_aggregates(age, count, total, total_sq, false_alarms, high_carb_meals, stress_events):
+    """Features from running sums; matches create_features on the same data."""
+    mean = total / count if count else 0
+    if count > 1:
+        std = math.sqrt(max(total_sq / count - mean * mean, 0.0))
+    else:
+        std = 0
+    return {
+        "age": DEFAULT_AGE if age is None else age,
+        "mean": mean,
+        "std": std,
+        "false_alarms": false_alarms,
+        "high_carb_meals": high_carb_meals,
+        "stress_events": stress_events,
+    }
+
+def feature_frame_from_aggregates(frame):
+    """Columnar features_from_aggregates for a DataFrame with one row per user.
+
+    Expects columns age, count, total, total_sq, false_alarms,
+    high_carb_meals, stress_events; returns a frame with FEATURE_NAMES.
+    """
+    count = frame["count"].to_numpy(dtype=np.float64)
+    total = frame["total"].to_numpy(dtype=np.float64)
+    mean = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+    variance = np.divide(frame["total_sq"].to_numpy(dtype=np.float64), count,
+                         out=np.zeros_like(total), where=count > 0) - mean * mean
+    std = np.where(count > 1, np.sqrt(np.maximum(variance, 0.0)), 0.0)
+    return frame.assign(
+        age=frame["age"].fillna(DEFAULT_AGE),
+        mean=mean,
+        std=std,
+    )[FEATURE_NAMES]
+
+def to_model_input(features):
+    return [features[name] for name in FEATURE_NAMES]
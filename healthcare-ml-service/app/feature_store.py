@@ -0,0 +1,211 @@
+import threading
+import time
+import logging
+
+from .feature_engineer import behavioral_counts, alert_counts, features_from_aggregates
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def window_start_ms(days, now_ms=None):
+    """Epoch ms of the first whole-day bucket inside a ``days`` window."""
+    now_ms = time.time() * 1000 if now_ms is None else now_ms
+    return (int(now_ms // DAY_MS) - days) * DAY_MS
+
+
+class _DayBuckets:
+    """Running totals of a fixed set of counters, bucketed by day.
+
+    ``totals`` always equals the sum of the live buckets, so reading a
+    window is O(1) after ``expire`` drops the O(days) stale buckets.
+    """
+
+    __slots__ = ("buckets", "totals")
+
+    def __init__(self, width):
+        self.buckets = {}
+        self.totals = [0] * width
+
+    def add(self, day, deltas):
+        bucket = self.buckets.get(day)
+        if bucket is None:
+            bucket = self.buckets[day] = [0] * len(deltas)
+        for i, delta in enumerate(deltas):
+            bucket[i] += delta
+            self.totals[i] += delta
+
+    def expire(self, min_day):
+        for day in [d for d in self.buckets if d < min_day]:
+            for i, value in enumerate(self.buckets.pop(day)):
+                self.totals[i] -= value
+
+
+class RollingFeatureStore:
+    """Per-user, per-metric rolling-window aggregates behind the model features.
+
+    Readings, behavioral logs and alert feedback are added one at a time as
+    they are ingested (or bulk-loaded from Mongo at startup); features are
+    then read from running count/sum/sum-of-squares and per-category counts
+    instead of re-reading 30 days of documents. Windows are whole days: a
+    lookup covers the current day plus the previous ``window_days`` days.
+    Once a day the first add expires stale buckets in every series and
+    drops series left empty, so series that are never read stay bounded.
+    """
+
+    def __init__(self, window_days=30, alert_window_days=90, clock=time.time):
+        self.window_days = window_days
+        self.alert_window_days = alert_window_days
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ages = {}
+        self._readings = {}   # (userId, metric) -> [count, sum, sum_sq]
+        self._logs = {}       # userId -> [high_carb_meals, stress_events]
+        self._alerts = {}     # (userId, metric) -> [false_alarms]
+        self._swept_day = self._today()
+
+    def _today(self, now_ms=None):
+        return int((self._clock() * 1000 if now_ms is None else now_ms) // DAY_MS)
+
+    def clear(self):
+        with self._lock:
+            self._ages.clear()
+            self._readings.clear()
+            self._logs.clear()
+            self._alerts.clear()
+
+    def set_user(self, user_id, age):
+        with self._lock:
+            self._ages[user_id] = age
+
+    def add_reading(self, user_id, metric, timestamp, value):
+        day = int(timestamp // DAY_MS)
+        today = self._today()
+        if day < today - self.window_days:
+            return
+        with self._lock:
+            self._sweep(today)
+            buckets = self._readings.get((user_id, metric))
+            if buckets is None:
+                buckets = self._readings[(user_id, metric)] = _DayBuckets(3)
+            buckets.add(day, (1, value, value * value))
+
+    def add_behavioral_log(self, user_id, timestamp, log):
+        day = int(timestamp // DAY_MS)
+        today = self._today()
+        if day < today - self.window_days:
+            return
+        counts = behavioral_counts(log)
+        with self._lock:
+            self._sweep(today)
+            buckets = self._logs.get(user_id)
+            if buckets is None:
+                buckets = self._logs[user_id] = _DayBuckets(2)
+            buckets.add(day, (counts["high_carb_meals"], counts["stress_events"]))
+
+    def add_alert_feedback(self, user_id, metric, timestamp, alert):
+        day = int(timestamp // DAY_MS)
+        today = self._today()
+        if day < today - self.alert_window_days:
+            return
+        counts = alert_counts(alert)
+        with self._lock:
+            self._sweep(today)
+            buckets = self._alerts.get((user_id, metric))
+            if buckets is None:
+                buckets = self._alerts[(user_id, metric)] = _DayBuckets(1)
+            buckets.add(day, (counts["false_alarms"],))
+
+    def _sweep(self, today):
+        # Lock held; does the O(series) pass at most once a day
+        if today <= self._swept_day:
+            return
+        self._swept_day = today
+        for series, days in ((self._readings, self.window_days), (self._logs, self.window_days),
+                             (self._alerts, self.alert_window_days)):
+            for key, buckets in list(series.items()):
+                buckets.expire(today - days)
+                if not buckets.buckets:
+                    del series[key]
+
+    def ingest(self, collection, doc):
+        """Route one Mongo document (e.g. from a change stream) to its aggregate."""
+        if collection == "users":
+            self.set_user(doc["id"], doc.get("age"))
+        elif collection == "healthdata":
+            self.add_reading(doc["userId"], doc["type"], doc["timestamp"], doc["value"])
+        elif collection == "behaviorallogs":
+            self.add_behavioral_log(doc["userId"], doc["timestamp"], doc)
+        elif collection == "alerts" and "userFeedback" in doc:
+            self.add_alert_feedback(doc["userId"], doc["metricType"], doc["timestamp"], doc)
+
+    def get_features(self, user_id, metric, now_ms=None):
+        """Current features for (user_id, metric), or None for an unknown user."""
+        today = self._today(now_ms)
+        with self._lock:
+            if user_id not in self._ages:
+                return None
+            count, total, total_sq = self._totals(self._readings.get((user_id, metric)), today - self.window_days, 3)
+            high_carb_meals, stress_events = self._totals(self._logs.get(user_id), today - self.window_days, 2)
+            false_alarms, = self._totals(self._alerts.get((user_id, metric)), today - self.alert_window_days, 1)
+            age = self._ages[user_id]
+        return features_from_aggregates(age, count, total, total_sq, false_alarms, high_carb_meals, stress_events)
+
+    def _totals(self, buckets, min_day, width):
+        if buckets is None:
+            return [0] * width
+        buckets.expire(min_day)
+        return buckets.totals
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._ages),
+                "readingSeries": len(self._readings),
+                "logSeries": len(self._logs),
+                "alertSeries": len(self._alerts),
+            }
+
+    def window_start(self, days):
+        return window_start_ms(days, self._clock() * 1000)
+
+    def load(self, db, metrics):
+        """Bulk-load the current windows from Mongo, streaming each collection once.
+
+        Starts from an empty store, so a load retried after a failure does
+        not count documents twice.
+        """
+        self.clear()
+        self.load_users(db)
+        self.load_readings(db, metrics)
+        self.load_behavioral_logs(db)
+        self.load_alert_feedback(db, metrics)
+        logger.info(f"Feature store loaded: {self.stats()}")
+
+    def load_users(self, db):
+        for user in db.users.find({}, {"_id": 0, "id": 1, "age": 1}):
+            self.set_user(user["id"], user.get("age"))
+
+    def load_readings(self, db, metrics):
+        for doc in db.healthdata.find(
+            {"type": {"$in": list(metrics)}, "timestamp": {"$gte": self.window_start(self.window_days)}},
+            {"_id": 0, "userId": 1, "type": 1, "timestamp": 1, "value": 1}
+        ).batch_size(10000):
+            self.add_reading(doc["userId"], doc["type"], doc["timestamp"], doc["value"])
+
+    def load_behavioral_logs(self, db):
+        for doc in db.behaviorallogs.find(
+            {"timestamp": {"$gte": self.window_start(self.window_days)}},
+            {"_id": 0, "userId": 1, "timestamp": 1, "dietType": 1, "moodType": 1}
+        ).batch_size(10000):
+            self.add_behavioral_log(doc["userId"], doc["timestamp"], doc)
+
+    def load_alert_feedback(self, db, metrics):
+        for doc in db.alerts.find(
+            {"metricType": {"$in": list(metrics)}, "userFeedback": {"$exists": True},
+             "timestamp": {"$gte": self.window_start(self.alert_window_days)}},
+            {"_id": 0, "userId": 1, "metricType": 1, "timestamp": 1, "userFeedback": 1}
+        ).batch_size(10000):
+            self.add_alert_feedback(doc["userId"], doc["metricType"], doc["timestamp"], doc)
@@ -0,0 +1,88 @@
+import argparse
+import logging
+from pymongo import ASCENDING
+
+from .data_loader import MongoDBLoader, loader_queries
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Compound indexes for the loader/trainer access patterns: equality fields
+# first (userId, type/metricType), then the timestamp range.
+INDEXES = {
+    "users": [
+        ("id_unique", [("id", ASCENDING)], {"unique": True}),
+    ],
+    "healthdata": [
+        ("userId_type_timestamp", [("userId", ASCENDING), ("type", ASCENDING), ("timestamp", ASCENDING)], {}),
+    ],
+    "behaviorallogs": [
+        ("userId_timestamp", [("userId", ASCENDING), ("timestamp", ASCENDING)], {}),
+    ],
+    "alerts": [
+        ("userId_metricType_timestamp", [("userId", ASCENDING), ("metricType", ASCENDING), ("timestamp", ASCENDING)], {}),
+    ],
+    # One precomputed suggestion per (userId, metric), upserted by training/score_all.py
+    "thresholdsuggestions": [
+        ("userId_metric_unique", [("userId", ASCENDING), ("metric", ASCENDING)], {"unique": True}),
+    ],
+}
+
+
+class QueryPlanError(RuntimeError):
+    """A loader query is planned as a collection scan."""
+
+
+def ensure_indexes(db):
+    """Create the indexes in INDEXES. Safe to run repeatedly."""
+    for collection, indexes in INDEXES.items():
+        for name, keys, options in indexes:
+            db[collection].create_index(keys, name=name, **options)
+            logger.info(f"Ensured index {collection}.{name}")
+
+
+def verify_query_plans(db, user_id="user-001", metric="GLUCOSE"):
+    """Explain every loader query and raise QueryPlanError on any COLLSCAN.
+
+    Returns {(collection, filter keys): winning plan stages} for reporting.
+    """
+    plans = {}
+    failures = []
+    for collection, query in loader_queries(user_id, metric):
+        explain = db[collection].find(query).explain()
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        plans[(collection, tuple(query))] = stages
+        if "COLLSCAN" in stages:
+            failures.append(f"{collection} {sorted(query)}: {' <- '.join(stages)}")
+
+    if failures:
+        raise QueryPlanError("Loader queries fall back to collection scans:\n  " + "\n  ".join(failures))
+    return plans
+
+
+def _plan_stages(plan):
+    # Classic plans nest via inputStage/inputStages; SBE plans wrap them in queryPlan
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("queryPlan", "inputStage"):
+            stages += _plan_stages(plan.get(key))
+        for child in plan.get("inputStages", []):
+            stages += _plan_stages(child)
+    return stages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create MongoDB indexes and verify loader query plans")
+    parser.add_argument("--verify", action="store_true", help="explain each loader query and fail on COLLSCAN")
+    parser.add_argument("--skip-create", action="store_true", help="only verify, do not create indexes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = MongoDBLoader().db
+    if not args.skip_create:
+        ensure_indexes(db)
+    if args.verify or args.skip_create:
+        for (collection, fields), stages in verify_query_plans(db).items():
+            print(f"{collection} {list(fields)}: {' <- '.join(stages)}")
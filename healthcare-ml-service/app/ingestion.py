@@ -0,0 +1,136 @@
+import threading
+import logging
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .metrics import Counter, Histogram
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+INGESTED_DOCUMENTS = Counter(
+    "ingested_documents_total", "Documents written by the ingestion buffer", ["collection"])
+INGEST_REJECTED = Counter(
+    "ingest_rejected_total", "Ingestion requests rejected with 429 because the buffer was full")
+INGEST_FLUSH_SECONDS = Histogram(
+    "ingest_flush_seconds", "insert_many duration per ingestion flush", ["collection"])
+
+# Mongo duplicate key: a retried document that the failed attempt already wrote
+DUPLICATE_KEY = 11000
+
+
+class IngestionBuffer:
+    """Buffers incoming documents and writes them with unordered insert_many.
+
+    A background thread flushes every ``flush_seconds``, or as soon as
+    ``batch_size`` documents are waiting. Documents count against
+    ``max_pending`` until written, so when Mongo falls behind ``offer``
+    refuses new work (the API answers 429) instead of growing without bound.
+    After each write the documents go to the RollingFeatureStore (if given)
+    and the cache entries they affect are invalidated.
+
+    ``_id`` is assigned before the first attempt, so after a connection
+    error the whole batch is retried and the copies the failed attempt
+    already wrote come back as duplicate-key errors, which are ignored.
+    """
+
+    COLLECTIONS = ("healthdata", "behaviorallogs")
+
+    def __init__(self, db, cache=None, feature_store=None, invalidator=None,
+                 batch_size=5000, flush_seconds=1.0, max_pending=100000, retry_seconds=1.0):
+        self.db = db
+        self.cache = cache
+        self.feature_store = feature_store
+        self.invalidator = invalidator
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.retry_seconds = retry_seconds
+        self._buffers = {collection: [] for collection in self.COLLECTIONS}
+        self._pending = 0  # buffered + being written
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def offer(self, collection, docs):
+        """Queue docs for writing; False (nothing queued) if the buffer is full."""
+        with self._lock:
+            if self._pending + len(docs) > self.max_pending:
+                INGEST_REJECTED.inc()
+                return False
+            self._buffers[collection].extend(docs)
+            self._pending += len(docs)
+            if sum(len(buffer) for buffer in self._buffers.values()) >= self.batch_size:
+                self._wake.set()
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ingestion-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        """Stop the flusher after writing whatever is still buffered."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            stopping = self._stop.is_set()
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self):
+        with self._lock:
+            batches, self._buffers = self._buffers, {collection: [] for collection in self.COLLECTIONS}
+        for collection, docs in batches.items():
+            for start in range(0, len(docs), self.batch_size):
+                self._write(collection, docs[start:start + self.batch_size])
+
+    def _write(self, collection, docs):
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        if self.invalidator is not None and self.feature_store is not None:
+            # Fed to the store below; the change stream must not add them again
+            self.invalidator.skip_inserts(doc["_id"] for doc in docs)
+
+        failed = set()
+        while True:
+            try:
+                with INGEST_FLUSH_SECONDS.time(collection=collection):
+                    self.db[collection].insert_many(docs, ordered=False)
+                break
+            except BulkWriteError as e:
+                # Unordered: everything but the reported documents was written
+                errors = [error for error in e.details.get("writeErrors", []) if error["code"] != DUPLICATE_KEY]
+                failed = {error["index"] for error in errors}
+                for error in errors[:5]:
+                    logger.error(f"Dropping {collection} document: {error.get('errmsg')}")
+                break
+            except PyMongoError as e:
+                if self._stop.is_set():
+                    logger.error(f"Lost {len(docs)} {collection} documents at shutdown: {str(e)}")
+                    failed = set(range(len(docs)))
+                    break
+                logger.error(f"Ingestion flush of {len(docs)} {collection} documents failed, retrying: {str(e)}")
+                # Wakes early on shutdown for one last attempt
+                self._stop.wait(self.retry_seconds)
+
+        written = [doc for index, doc in enumerate(docs) if index not in failed]
+        INGESTED_DOCUMENTS.inc(len(written), collection=collection)
+        for doc in written:
+            if self.feature_store is not None:
+                self.feature_store.ingest(collection, doc)
+            if self.cache is not None:
+                self.cache.invalidate(doc["userId"], doc.get("type"))
+        with self._lock:
+            self._pending -= len(docs)
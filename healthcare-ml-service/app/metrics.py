@@ -0,0 +1,198 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import deque
+
+# Latency buckets in seconds: sub-millisecond model calls up to slow cold loads
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, rendered in the Prometheus text format."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, **labels):
+        """Context manager / decorator (sync or async) observing elapsed seconds."""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {values[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        self.histogram.observe(elapsed, **self.labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((self.histogram.name, self.labels, elapsed))
+
+    def __call__(self, fn):
+        histogram, labels = self.histogram, self.labels
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed_async(*args, **kwargs):
+                with _Timer(histogram, labels):
+                    return await fn(*args, **kwargs)
+            return timed_async
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            with _Timer(histogram, labels):
+                return fn(*args, **kwargs)
+        return timed
+
+
+def register_collector(collect):
+    """``collect()`` returns [(name, type, help, value)] sampled at scrape time."""
+    _collectors.append(collect)
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    for collect in _collectors:
+        for name, metric_type, documentation, value in collect():
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Request-level profiling: when a request is sampled, every timer that runs
+# in its context also records (metric, labels, seconds) on the request trace.
+# Work handed to the prediction pool keeps the context (see ModelPredictor),
+# so the trace covers the whole request.
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+class RequestProfiler:
+    """Runtime-toggleable per-request stage breakdown for a sample of requests."""
+
+    def __init__(self, sample_rate=0.0, keep=100):
+        self.sample_rate = sample_rate
+        self.recent = deque(maxlen=keep)
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def start(self):
+        """Begin tracing the current request if sampled; returns a token or None."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        return _current_trace.set([])
+
+    def finish(self, token, method, path, status_code, seconds):
+        trace = _current_trace.get()
+        _current_trace.reset(token)
+        self.recent.append({
+            "method": method,
+            "path": path,
+            "status": status_code,
+            "totalMs": seconds * 1000,
+            "stages": [
+                {"metric": name, **labels, "ms": elapsed * 1000}
+                for name, labels, elapsed in trace
+            ],
+        })
+
+
+# Prediction-path metrics
+
+MONGO_QUERY_SECONDS = Histogram(
+    "mongo_query_seconds", "MongoDB round trip per loader query", ["query"])
+PREDICTION_STAGE_SECONDS = Histogram(
+    "prediction_stage_seconds", "Prediction time by stage (features, model_load, inference, serialization)", ["stage"])
+REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "HTTP request latency", ["method", "path"])
+FALLBACK_RESPONSES = Counter(
+    "fallback_responses_total", "Suggestions answered with the static fallback thresholds")
+MODEL_CACHE_MISSES = Counter(
+    "model_cache_misses_total", "Model lookups not already loaded in memory", ["metric"])
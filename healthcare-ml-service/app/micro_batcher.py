@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collects concurrent single predictions into ModelPredictor batches.
+
+    Requests arriving within ``window_ms`` of the first queued one (or until
+    ``max_batch_size`` distinct keys are queued) are scored together by
+    ``predict_batch``: one feature query and one model call per metric.
+    Requests for a (userId, metric) already queued or being scored wait on
+    that result instead of adding work (single flight). Must be used from
+    the event loop thread.
+    """
+
+    def __init__(self, predictor, window_ms=2.0, max_batch_size=64):
+        self.predictor = predictor
+        self.window_seconds = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = {}    # key -> future, waiting for the next flush
+        self._in_flight = {}  # key -> future, queued or being scored
+        self._timer = None
+        self._tasks = set()   # scoring tasks, kept so they are not collected mid-flight
+
+    async def predict(self, user_id: str, metric: str):
+        key = (user_id, metric)
+        future = self._in_flight.get(key)
+        if future is None:
+            # A miss is counted by predict_batch's own lookup
+            cached = self.predictor.cache.get(key, count_miss=False)
+            if cached is not None:
+                return cached.suggestion
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window_seconds, self._flush)
+        # A cancelled caller must not cancel the result other callers share
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._score(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def close(self):
+        """Cancel queued and running batches; their callers get CancelledError."""
+        self._cancel(self._pending)
+        self._pending = {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _score(self, batch):
+        keys = list(batch)
+        try:
+            suggestions = await self.predictor.predict_batch_async(keys)
+        except asyncio.CancelledError:
+            # Waiting callers would otherwise hang on futures nobody resolves
+            self._cancel(batch)
+            raise
+        except Exception as e:
+            # predict_batch falls back per pair; this only guards the executor
+            logger.error(f"Micro-batch of {len(keys)} failed: {str(e)}")
+            suggestions = [self.predictor._fallback_suggestion() for _ in keys]
+        for key, suggestion in zip(keys, suggestions):
+            self._in_flight.pop(key, None)
+            batch[key].set_result(suggestion)
+
+    def _cancel(self, batch):
+        for key, future in batch.items():
+            self._in_flight.pop(key, None)
+            if not future.done():
+                future.cancel()
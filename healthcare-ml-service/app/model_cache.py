@@ -0,0 +1,82 @@
+import os
+import shutil
+import uuid
+import logging
+
+from .compiled_forest import CompiledForest
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class SharedModelCache:
+    """Compiled forests saved once and memory-mapped by every worker process.
+
+    Layout: ``<directory>/<model name>/<version>/`` as written by
+    CompiledForest.save. Workers map the arrays read-only, so N workers on a
+    host share one copy in the page cache instead of holding N. Point it at
+    tmpfs (e.g. /dev/shm) to keep the files in memory.
+
+    The first worker to load a version writes it to a private temp directory
+    and renames it into place; a worker losing that race maps the winner's
+    copy. Only the ``keep`` most recently used versions per model are kept
+    on disk (mapping a version marks it used), and never the one just
+    written, so rolling an alias back to an older version works like a
+    promotion. Workers still mapping a removed version keep their mapping.
+    """
+
+    def __init__(self, directory, keep=2):
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, model_name, version):
+        return os.path.join(self.directory, model_name, str(version))
+
+    def get(self, model_name, version):
+        """The mapped forest, or None if no worker has saved this version yet."""
+        path = self._path(model_name, version)
+        try:
+            forest = CompiledForest.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            # Not saved yet, or pruned by another worker
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return forest
+
+    def put(self, model_name, version, forest):
+        """Save forest (unless already there) and return the mapped copy."""
+        path = self._path(model_name, version)
+        tmp = os.path.join(self.directory, model_name, f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+        try:
+            # Renamed into place whole, so get() never sees a partial copy
+            forest.save(tmp)
+            os.rename(tmp, path)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                logger.warning(f"Could not share {model_name} version {version} in {self.directory}: {str(e)}")
+                return forest
+        # Mapped before pruning, so the mapping survives whatever is removed
+        shared = self.get(model_name, version)
+        self._prune(model_name, version)
+        return shared if shared is not None else forest
+
+    def _prune(self, model_name, current):
+        """Remove all but the ``keep`` most recently used versions, never ``current``."""
+        model_dir = os.path.join(self.directory, model_name)
+        try:
+            versions = [name for name in os.listdir(model_dir) if name.isdigit() and name != str(current)]
+        except OSError:
+            return
+        for name in sorted(versions, key=lambda name: self._last_used(model_dir, name), reverse=True)[max(self.keep - 1, 0):]:
+            shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+
+    @staticmethod
+    def _last_used(model_dir, name):
+        try:
+            return os.stat(os.path.join(model_dir, name)).st_mtime_ns
+        except OSError:
+            return 0
@@ -1,10 +1,21 @@
-import mlflow
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
 import numpy as np
 from .schemas import ThresholdSuggestion
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import os
 from dotenv import load_dotenv
-from .data_loader import MongoDBLoader
+from .data_loader import MongoDBLoader, AsyncMongoDBLoader
+from .feature_cache import FeatureCache, CachedPrediction
+from .feature_engineer import FEATURE_NAMES, create_features, to_model_input
+from .compiled_forest import CompiledForest
+from .model_cache import SharedModelCache
+from .feature_store import RollingFeatureStore
+from .metrics import PREDICTION_STAGE_SECONDS, FALLBACK_RESPONSES, MODEL_CACHE_MISSES
 import logging
 import traceback # NEW IMPORT
 
@@ -13,130 +24,554 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Metrics with a personalized threshold model
+METRIC_MODELS = {
+    "GLUCOSE": "threshold_GLUCOSE",
+    "HEART_RATE": "threshold_HEART_RATE"
+}
+
+LoadedModel = namedtuple("LoadedModel", ["model", "name", "version", "run_id"])
+
+def suggestion_confidence(mean, std):
+    """Confidence from the reading spread; scalars or arrays (batch scoring)."""
+    mean = np.asarray(mean, dtype=np.float64)
+    ratio = np.asarray(std, dtype=np.float64) / np.where(mean != 0, mean, 1.0)
+    return np.where(mean != 0, np.clip(1 - ratio, 0.7, 0.95), 0.8)
+
 class ModelPredictor:
     def __init__(self):
+        # Cheap by design: no imports of mlflow and no connections until
+        # connect() (API lifespan) or first use
         self.models = {}
-        self.metric_models = {
-            "GLUCOSE": "threshold_glucose",
-            "HEART_RATE": "threshold_heart_rate"
-        }
-        self.data_loader = MongoDBLoader()
+        self.metric_models = dict(METRIC_MODELS)
+        self._data_loader = None
+        self._async_data_loader = None
+        self._connect_lock = threading.Lock()
+        self._mlflow_module = None
+        self._model_lock = threading.Lock()
+        self._poller = None
+        self._poller_stop = threading.Event()
+        self._input_buffers = threading.local()
+
+        # Score forests with the array-backed CompiledForest instead of
+        # sklearn's per-call validation and tree dispatch (same predictions)
+        self.compile_models = os.getenv("COMPILE_MODELS", "true").lower() == "true"
+
+        # With several workers, compiled forests are saved once under
+        # MODEL_SHARE_DIR and memory-mapped by all of them
+        share_dir = os.getenv("MODEL_SHARE_DIR")
+        self.shared_models = SharedModelCache(share_dir) if share_dir and self.compile_models else None
+
+        # Registry alias served for every metric; "latest" means highest version
+        self.model_alias = os.getenv("MODEL_ALIAS", "champion")
+
+        # After a failed load, requests for that metric fall back for this
+        # long instead of each retrying the registry (the poller keeps trying)
+        self.load_retry_seconds = float(os.getenv("MODEL_LOAD_RETRY_SECONDS", "30"))
+        self._load_failed_at = {}
+
+        # "aggregate": features computed in Mongo by one pipeline per request
+        # "documents": fetch raw documents and compute features in Python
+        # "store": features read from the in-memory rolling feature store
+        self.feature_mode = os.getenv("FEATURE_MODE", "aggregate")
+        self.feature_store = RollingFeatureStore()
+
+        # Serve suggestions precomputed by training/score_all.py while they are
+        # younger than this and come from the served model version; 0 disables
+        self.precomputed_max_age = timedelta(hours=float(os.getenv("PRECOMPUTED_MAX_AGE_HOURS", "26")))
+
+        # Inputs are 30-day windows, so recent features/suggestions are reused;
+        # FEATURE_CACHE_SIZE=0 disables the cache. Invalidations are remembered
+        # as long as a precomputed suggestion may be served, see below
+        self.cache = FeatureCache(
+            max_entries=int(os.getenv("FEATURE_CACHE_SIZE", "10000")),
+            ttl_seconds=float(os.getenv("FEATURE_CACHE_TTL_SECONDS", "900")),
+            remember_seconds=self.precomputed_max_age.total_seconds()
+        )
+
+        # Bounded pool for CPU-bound feature building and inference; sklearn's
+        # tree traversal releases the GIL, so threads scale across cores.
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("PREDICTION_WORKERS", "4")),
+            thread_name_prefix="predict"
+        )
         
-        # Set MLflow tracking URI
-        tracking_uri = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5008")
-        logger.info(f"Using MLflow tracking URI: {tracking_uri}")
-        mlflow.set_tracking_uri(tracking_uri)
-       
-        # Test connection
+        self.tracking_uri = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5008")
+        # MLflow's own defaults (120s timeout, 7 retries with backoff) let an
+        # unreachable registry stall model loading for minutes
+        os.environ.setdefault("MLFLOW_HTTP_REQUEST_TIMEOUT", "10")
+        os.environ.setdefault("MLFLOW_HTTP_REQUEST_MAX_RETRIES", "2")
+
+    @property
+    def data_loader(self):
+        if self._data_loader is None:
+            self.connect()
+        return self._data_loader
+
+    @data_loader.setter
+    def data_loader(self, loader):
+        self._data_loader = loader
+
+    @property
+    def async_data_loader(self):
+        if self._async_data_loader is None:
+            self.connect()
+        return self._async_data_loader
+
+    @async_data_loader.setter
+    def async_data_loader(self, loader):
+        self._async_data_loader = loader
+
+    def connect(self):
+        """Create the Mongo clients (they connect in the background, with
+        MONGO_TIMEOUT_MS bounding each operation's server selection)."""
+        with self._connect_lock:
+            if self._data_loader is None:
+                self._data_loader = MongoDBLoader()
+            if self._async_data_loader is None:
+                self._async_data_loader = AsyncMongoDBLoader()
+
+    def _mlflow(self):
+        """The mlflow module, imported on first use: it is most of the
+        service's import time and only model loading needs it."""
+        if self._mlflow_module is None:
+            import mlflow
+            import mlflow.sklearn
+            logger.info(f"Using MLflow tracking URI: {self.tracking_uri}")
+            mlflow.set_tracking_uri(self.tracking_uri)
+            self._mlflow_module = mlflow
+        return self._mlflow_module
+
+    def load_model(self, metric: str) -> LoadedModel:
+        if metric in self.models:
+            return self.models[metric]
+        MODEL_CACHE_MISSES.inc(metric=metric if metric in self.metric_models else "unsupported")
+        self._check_load_backoff(metric)
+        # Pool threads may race to load the same model; only one should do it
+        with self._model_lock:
+            if metric not in self.models:
+                # Threads queued behind a failed load fail fast too
+                self._check_load_backoff(metric)
+                try:
+                    self.models[metric] = self._fetch_model(metric)
+                except Exception:
+                    if metric in self.metric_models:
+                        self._load_failed_at[metric] = time.monotonic()
+                    raise
+                self._load_failed_at.pop(metric, None)
+            return self.models[metric]
+
+    def _check_load_backoff(self, metric):
+        failed_at = self._load_failed_at.get(metric)
+        if failed_at is not None and time.monotonic() - failed_at < self.load_retry_seconds:
+            raise RuntimeError(f"Model for {metric} failed to load recently; not retrying for {self.load_retry_seconds:.0f}s")
+
+    def resolve_model_version(self, metric: str):
+        """(model_uri, version, run_id) the registry currently serves for metric."""
+        model_name = self.metric_models.get(metric)
+        if not model_name:
+            logger.error(f"Unsupported metric: {metric}")
+            raise ValueError(f"Unsupported metric: {metric}")
+
+        client = self._mlflow().tracking.MlflowClient()
+        if self.model_alias == "latest":
+            versions = client.search_model_versions(f"name='{model_name}'")
+            if not versions:
+                raise ValueError(f"No registered versions of {model_name}")
+            model_version = max(versions, key=lambda v: int(v.version))
+        else:
+            model_version = client.get_model_version_by_alias(model_name, self.model_alias)
+        # Pin the exact version so the load matches what was resolved
+        return f"models:/{model_name}/{model_version.version}", model_version.version, model_version.run_id
+
+    @PREDICTION_STAGE_SECONDS.time(stage="model_load")
+    def _fetch_model(self, metric: str, resolved=None) -> LoadedModel:
+        model_uri, version, run_id = resolved or self.resolve_model_version(metric)
+        model_name = self.metric_models[metric]
+        if self.shared_models is not None:
+            shared = self.shared_models.get(model_name, version)
+            if shared is not None:
+                logger.info(f"Mapped {model_name} version {version} from {self.shared_models.directory}")
+                return LoadedModel(shared, model_name, version, run_id)
+        logger.info(f"Attempting to load model from registry URI: {model_uri}")
         try:
-            mlflow.search_experiments()
-            logger.info("MLflow connection successful")
+            # The native estimator skips pyfunc's DataFrame conversion and
+            # schema checks on every call
+            model = self._mlflow().sklearn.load_model(model_uri)
+            logger.info(f"Successfully loaded model: {model_name} version {version}")
         except Exception as e:
-            logger.error(f"MLflow connection failed: {str(e)}")
-    
-    def load_model(self, metric: str):
-        if metric not in self.models:
-            model_name = self.metric_models.get(metric)
-            if not model_name:
-                logger.error(f"Unsupported metric: {metric}")
-                raise ValueError(f"Unsupported metric: {metric}")
-                
-            # Load model directly from mounted artifact path for debugging
-            if metric == "GLUCOSE":
-                # Use the run ID from the latest GLUCOSE training run
-                run_id = "3cae630e765c4fd8ae8e89a9f368de90" 
-            elif metric == "HEART_RATE":
-                # Use the run ID from the latest HEART_RATE training run
-                run_id = "aa610fb7d9b54147ba63bb3c03ddc1af"
-            else:
-                logger.error(f"Unsupported metric for direct load: {metric}")
-                raise ValueError(f"Unsupported metric for direct load: {metric}")
+            logger.error(f"Failed to load model {model_name} from {model_uri}: {str(e)}")
+            traceback.print_exc()
+            raise # Re-raise to be caught by predict's outer try-except
+        if self.compile_models:
+            try:
+                model = CompiledForest.from_sklearn(model)
+            except TypeError as e:
+                logger.warning(f"Serving {model_name} without compilation: {str(e)}")
+        if self.shared_models is not None and isinstance(model, CompiledForest):
+            model = self.shared_models.put(model_name, version, model)
+        return LoadedModel(model, model_name, version, run_id)
 
-            # Construct the file URI to the mounted artifacts
-            # The artifacts are mounted at /mlflow_artifacts in the container
-            model_uri = f"file:///mlflow_artifacts/1/{run_id}/artifacts/model" 
-            logger.info(f"Attempting to load model from FILE URI: {model_uri}")
+    def warm_up(self):
+        """Load every metric's model up front so no request pays a cold load."""
+        for metric in self.metric_models:
             try:
-                self.models[metric] = mlflow.pyfunc.load_model(model_uri)
-                logger.info(f"Successfully loaded model: {model_name} from file URI {model_uri}")
+                self.load_model(metric)
             except Exception as e:
-                logger.error(f"Failed to load model {model_name} from {model_uri} (File URI): {str(e)}")
-                traceback.print_exc()
-                raise # Re-raise to be caught by predict's outer try-except
-        return self.models[metric]
+                logger.error(f"Warm-up failed for {metric}: {str(e)}")
+        return self.is_ready()
+
+    def is_ready(self):
+        return all(metric in self.models for metric in self.metric_models)
+
+    def model_status(self):
+        status = {}
+        for metric, model_name in self.metric_models.items():
+            loaded = self.models.get(metric)
+            status[metric] = {
+                "model": model_name,
+                "alias": self.model_alias,
+                "loaded": loaded is not None,
+                "version": loaded.version if loaded else None,
+                "runId": loaded.run_id if loaded else None,
+            }
+        return status
+
+    def refresh_models(self):
+        """Swap in newly promoted versions. Returns the metrics that changed.
+
+        The new model is fully loaded before it replaces the old one in a
+        single dict assignment, so in-flight requests keep the model they
+        started with and new ones only ever see a complete model.
+        """
+        changed = []
+        for metric in self.metric_models:
+            try:
+                resolved = self.resolve_model_version(metric)
+                current = self.models.get(metric)
+                if current is not None and current.version == resolved[1]:
+                    continue
+                loaded = self._fetch_model(metric, resolved)
+                with self._model_lock:
+                    self.models[metric] = loaded
+                    self._load_failed_at.pop(metric, None)
+                # Cached suggestions came from the previous version
+                self.cache.invalidate_metric(metric)
+                changed.append(metric)
+                logger.info(f"Now serving {loaded.name} version {loaded.version} for {metric}")
+            except Exception as e:
+                logger.error(f"Model refresh failed for {metric}: {str(e)}")
+        return changed
+
+    def start_model_poller(self, interval_seconds: float):
+        self._poller_stop.clear()
+        self._poller = threading.Thread(
+            target=self._poll_models, args=(interval_seconds,), name="model-poller", daemon=True
+        )
+        self._poller.start()
+
+    def stop_model_poller(self):
+        self._poller_stop.set()
+        if self._poller:
+            self._poller.join(timeout=5)
+
+    def _poll_models(self, interval_seconds):
+        while not self._poller_stop.wait(interval_seconds):
+            self.refresh_models()
     
     def predict(self, user_id: str, metric: str) -> ThresholdSuggestion:
         try:
-            logger.info(f"Entering predict method for user: {user_id}, metric: {metric}")
-            
-            # Fetch user data
-            user_data = self.data_loader.get_user_data(user_id)
-            if not user_data:
-                logger.error(f"No user found with ID: {user_id}")
-                raise ValueError(f"No user found with ID: {user_id}")
-            logger.info(f"Fetched user data for {user_id}")
-                
-            health_data = self.data_loader.get_health_data(user_id, metric)
-            behavioral_logs = self.data_loader.get_behavioral_logs(user_id)
-            alerts = self.data_loader.get_alert_feedback(user_id, metric)
-            logger.info(f"Fetched health data, behavioral logs, and alerts for {user_id}")
-            
-            # Create features
-            values = [d['value'] for d in health_data]
-            features = {
-                "age": user_data.get("age", 50),
-                "mean": np.mean(values) if values else 0,
-                "std": np.std(values) if len(values) > 1 else 0,
-                "false_alarms": sum(1 for a in alerts if a.get("userFeedback") == "DISMISSED_FALSE_ALARM"),
-                "high_carb_meals": sum(1 for log in behavioral_logs if log.get("dietType") == "High Carb Meal"),
-                "stress_events": sum(1 for log in behavioral_logs if log.get("moodType") == "Stressed"),
-            }
-            logger.info(f"Created features: {features}")
-            
-            model = self.load_model(metric)
-            logger.info(f"Model loaded for {metric}")
-            
-            # Convert features to model input format
-            input_data = [[
-                features["mean"],
-                features["std"],
-                features["false_alarms"],
-                features["high_carb_meals"],
-                features["stress_events"],
-                features["age"]
-            ]]
-            logger.info(f"Input data for prediction: {input_data}")
-            
-            # Predict and format results
-            prediction = model.predict(input_data)[0]
-            low, high = prediction[0], prediction[1]
-            logger.info(f"Prediction raw result: {prediction}")
-            
-            # Get model version
-            model_version = self.models[metric]._model_meta.run_id
-            logger.info(f"Model version: {model_version}")
+            cached = self.cache.get((user_id, metric))
+            if cached is not None:
+                return cached.suggestion
+
+            if self.precomputed_max_age:
+                suggestion = self._precomputed_suggestion(
+                    self.data_loader.get_threshold_suggestion(user_id, metric), metric
+                )
+                if suggestion is not None:
+                    self.cache.put((user_id, metric), CachedPrediction(None, suggestion))
+                    return suggestion
             
-            # Calculate confidence with proper parentheses
-            if features["mean"]:
-                confidence = min(0.95, max(0.7, 1 - (features["std"] / features["mean"])))
+            if self.feature_mode == "store":
+                features = self._store_features(user_id, metric)
+                if features is None:
+                    logger.error(f"No user found with ID: {user_id}")
+                    raise ValueError(f"No user found with ID: {user_id}")
+            elif self.feature_mode == "aggregate":
+                feature_doc = self.data_loader.get_feature_document(user_id, metric)
+                if not feature_doc:
+                    logger.error(f"No user found with ID: {user_id}")
+                    raise ValueError(f"No user found with ID: {user_id}")
+                features = self._features_from_document(feature_doc)
             else:
-                confidence = 0.8
-            logger.info(f"Confidence: {confidence}")
+                # Fetch user data
+                user_data = self.data_loader.get_user_data(user_id)
+                if not user_data:
+                    logger.error(f"No user found with ID: {user_id}")
+                    raise ValueError(f"No user found with ID: {user_id}")
+                    
+                health_data = self.data_loader.get_health_data(user_id, metric)
+                behavioral_logs = self.data_loader.get_behavioral_logs(user_id)
+                alerts = self.data_loader.get_alert_feedback(user_id, metric)
+                features = self._build_features(user_data, health_data, behavioral_logs, alerts)
             
-            return ThresholdSuggestion(
-                suggestedThresholds={"low": low, "high": high},
-                modelVersion=model_version,
-                suggestionTimestamp=datetime.utcnow().isoformat() + "Z",
-                confidence=confidence
-            )
+            suggestion = self._score(metric, features)
+            self.cache.put((user_id, metric), CachedPrediction(features, suggestion))
+            return suggestion
             
         except Exception as e:
             logger.error(f"Prediction failed: {str(e)}")
             traceback.print_exc() # NEW LINE
-            # Return fallback values
-            return ThresholdSuggestion(
-                suggestedThresholds={"low": 70, "high": 180},
-                modelVersion="fallback_v1",
-                suggestionTimestamp=datetime.utcnow().isoformat() + "Z",
-                confidence=0.8
+            return self._fallback_suggestion()
+
+    async def predict_async(self, user_id: str, metric: str) -> ThresholdSuggestion:
+        """Event-loop friendly predict.
+
+        Mongo I/O goes through the async client (one feature aggregation, or
+        the four document queries run concurrently in "documents" mode) and
+        inference runs on the bounded prediction pool, so a slow query or
+        model load never stalls other in-flight requests.
+        """
+        try:
+            cached = self.cache.get((user_id, metric))
+            if cached is not None:
+                return cached.suggestion
+
+            if self.precomputed_max_age:
+                suggestion = self._precomputed_suggestion(
+                    await self.async_data_loader.get_threshold_suggestion(user_id, metric), metric
+                )
+                if suggestion is not None:
+                    self.cache.put((user_id, metric), CachedPrediction(None, suggestion))
+                    return suggestion
+
+            if self.feature_mode == "store":
+                features = self._store_features(user_id, metric)
+                if features is None:
+                    logger.error(f"No user found with ID: {user_id}")
+                    raise ValueError(f"No user found with ID: {user_id}")
+            elif self.feature_mode == "aggregate":
+                feature_doc = await self.async_data_loader.get_feature_document(user_id, metric)
+                if not feature_doc:
+                    logger.error(f"No user found with ID: {user_id}")
+                    raise ValueError(f"No user found with ID: {user_id}")
+                features = self._features_from_document(feature_doc)
+            else:
+                user_data, health_data, behavioral_logs, alerts = \
+                    await self.async_data_loader.get_prediction_inputs(user_id, metric)
+                if not user_data:
+                    logger.error(f"No user found with ID: {user_id}")
+                    raise ValueError(f"No user found with ID: {user_id}")
+                features = self._build_features(user_data, health_data, behavioral_logs, alerts)
+
+            loop = asyncio.get_running_loop()
+            # copy_context: timings recorded in the pool belong to this request's trace
+            suggestion = await loop.run_in_executor(
+                self.executor, contextvars.copy_context().run, self._score, metric, features
             )
+            self.cache.put((user_id, metric), CachedPrediction(features, suggestion))
+            return suggestion
+        except Exception as e:
+            logger.error(f"Prediction failed: {str(e)}")
+            traceback.print_exc()
+            return self._fallback_suggestion()
+
+    async def predict_batch_async(self, requests):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, contextvars.copy_context().run, self.predict_batch, list(requests)
+        )
+
+    def predict_batch(self, requests):
+        """Score many (user_id, metric) pairs with grouped queries.
+
+        Pairs found in the feature cache, or with a fresh precomputed
+        suggestion (one indexed query per metric), are answered from them. For the rest,
+        features come from one aggregation per metric (or, in documents mode,
+        users and behavioral logs once for the batch plus health data and
+        alert feedback once per metric), and each metric's model is called
+        once on a stacked feature matrix. Results are returned in the order
+        of ``requests``; pairs that cannot be scored get the fallback
+        suggestion, exactly as ``predict`` would.
+        """
+        requests = list(requests)
+        results = {}
+
+        user_ids_by_metric = {}
+        for key in dict.fromkeys(requests):
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[key] = cached.suggestion
+            else:
+                user_id, metric = key
+                # dict keys double as an insertion-ordered set
+                user_ids_by_metric.setdefault(metric, {})[user_id] = None
+
+        if self.precomputed_max_age:
+            for metric, metric_user_ids in list(user_ids_by_metric.items()):
+                try:
+                    docs = self.data_loader.get_threshold_suggestions(metric_user_ids, metric)
+                except Exception as e:
+                    logger.error(f"Precomputed suggestion lookup failed for {metric}: {str(e)}")
+                    continue
+                for user_id, doc in docs.items():
+                    suggestion = self._precomputed_suggestion(doc, metric)
+                    if suggestion is not None:
+                        self.cache.put((user_id, metric), CachedPrediction(None, suggestion))
+                        results[(user_id, metric)] = suggestion
+                        del metric_user_ids[user_id]
+                if not metric_user_ids:
+                    del user_ids_by_metric[metric]
+
+        users, behavioral_logs = {}, {}
+        if self.feature_mode == "documents" and user_ids_by_metric:
+            try:
+                users = self.data_loader.get_users_data(
+                    {user_id for user_ids in user_ids_by_metric.values() for user_id in user_ids}
+                )
+                behavioral_logs = self.data_loader.get_behavioral_logs_for_users(users.keys())
+            except Exception as e:
+                logger.error(f"Batch data fetch failed: {str(e)}")
+                traceback.print_exc()
+
+        for metric, metric_user_ids in user_ids_by_metric.items():
+            try:
+                loaded = self.load_model(metric)
+                if self.feature_mode == "store":
+                    features = {}
+                    for user_id in metric_user_ids:
+                        user_features = self._store_features(user_id, metric)
+                        if user_features is not None:
+                            features[user_id] = user_features
+                elif self.feature_mode == "aggregate":
+                    feature_docs = self.data_loader.get_feature_documents(metric_user_ids, metric)
+                    features = {
+                        user_id: self._features_from_document(doc)
+                        for user_id, doc in feature_docs.items()
+                    }
+                else:
+                    scored_ids = [user_id for user_id in metric_user_ids if user_id in users]
+                    health_data = self.data_loader.get_health_data_for_users(scored_ids, metric)
+                    alerts = self.data_loader.get_alert_feedback_for_users(scored_ids, metric)
+                    features = {
+                        user_id: self._build_features(
+                            users[user_id],
+                            health_data.get(user_id, []),
+                            behavioral_logs.get(user_id, []),
+                            alerts.get(user_id, []),
+                        )
+                        for user_id in scored_ids
+                    }
+
+                for user_id in metric_user_ids:
+                    if user_id not in features:
+                        logger.error(f"No user found with ID: {user_id}")
+                if not features:
+                    continue
+
+                input_data = self._input_matrix(features.values())
+                with PREDICTION_STAGE_SECONDS.time(stage="inference"):
+                    predictions = loaded.model.predict(input_data)
+                for (user_id, user_features), prediction in zip(features.items(), predictions):
+                    suggestion = self._make_suggestion(loaded, prediction, user_features)
+                    self.cache.put((user_id, metric), CachedPrediction(user_features, suggestion))
+                    results[(user_id, metric)] = suggestion
+                logger.debug("Scored %d users for %s", len(features), metric)
+            except Exception as e:
+                logger.error(f"Batch prediction failed for {metric}: {str(e)}")
+                traceback.print_exc()
+
+        return [results.get(key) or self._fallback_suggestion() for key in requests]
+
+    def _score(self, metric, features) -> ThresholdSuggestion:
+        loaded = self.load_model(metric)
+        
+        # Convert features into this thread's preallocated float64 row
+        input_data = getattr(self._input_buffers, "row", None)
+        if input_data is None:
+            input_data = self._input_buffers.row = np.empty((1, len(FEATURE_NAMES)), dtype=np.float64)
+        input_data[0] = self._to_model_input(features)
+        
+        # Predict and format results
+        with PREDICTION_STAGE_SECONDS.time(stage="inference"):
+            prediction = loaded.model.predict(input_data)[0]
+        # Lazy %-formatting: nothing is formatted unless DEBUG is enabled
+        logger.debug("Prediction for %s: %s from features %s", metric, prediction, features)
+        
+        return self._make_suggestion(loaded, prediction, features)
+
+    @PREDICTION_STAGE_SECONDS.time(stage="features")
+    def _store_features(self, user_id, metric):
+        return self.feature_store.get_features(user_id, metric)
+
+    @PREDICTION_STAGE_SECONDS.time(stage="features")
+    def _build_features(self, user_data, health_data, behavioral_logs, alerts):
+        return create_features(user_data, health_data, behavioral_logs, alerts)
+
+    @PREDICTION_STAGE_SECONDS.time(stage="features")
+    def _features_from_document(self, feature_doc):
+        return {
+            "age": feature_doc["age"],
+            "mean": feature_doc["mean"],
+            "std": feature_doc["std"] if feature_doc["count"] > 1 else 0,
+            "false_alarms": feature_doc["false_alarms"],
+            "high_carb_meals": feature_doc["high_carb_meals"],
+            "stress_events": feature_doc["stress_events"],
+        }
+
+    def _to_model_input(self, features):
+        # Same column order the trainer fits on
+        return to_model_input(features)
+
+    def _input_matrix(self, features_list):
+        features_list = list(features_list)
+        input_data = np.empty((len(features_list), len(FEATURE_NAMES)), dtype=np.float64)
+        for row, features in zip(input_data, features_list):
+            row[:] = self._to_model_input(features)
+        return input_data
+
+    def _make_suggestion(self, loaded, prediction, features) -> ThresholdSuggestion:
+        low, high = prediction[0], prediction[1]
+        
+        # Get model version
+        model_version = loaded.run_id
+        
+        confidence = float(suggestion_confidence(features["mean"], features["std"]))
+        
+        return ThresholdSuggestion(
+            suggestedThresholds={"low": low, "high": high},
+            modelVersion=model_version,
+            suggestionTimestamp=datetime.utcnow().isoformat() + "Z",
+            confidence=confidence
+        )
+
+    def _precomputed_suggestion(self, doc, metric):
+        """ThresholdSuggestion from a thresholdsuggestions doc, or None if missing or stale
+        (too old, from another model version, or older than the user's latest data)."""
+        if not doc or datetime.utcnow() - doc["computedAt"] > self.precomputed_max_age:
+            return None
+        # A promotion since the scoring run makes the entry stale
+        loaded = self.models.get(metric)
+        if loaded is not None and doc["modelVersion"] != loaded.run_id:
+            return None
+        # So does data that arrived after it (ingestion or the change stream
+        # invalidated the user); computedAt is naive UTC
+        computed_at = doc["computedAt"].replace(tzinfo=timezone.utc).timestamp()
+        if self.cache.invalidated_at(doc["userId"], metric) >= computed_at:
+            return None
+        return ThresholdSuggestion(
+            suggestedThresholds=doc["suggestedThresholds"],
+            modelVersion=doc["modelVersion"],
+            suggestionTimestamp=doc["suggestionTimestamp"],
+            confidence=doc["confidence"]
+        )
+
+    def _fallback_suggestion(self) -> ThresholdSuggestion:
+        FALLBACK_RESPONSES.inc()
+        return ThresholdSuggestion(
+            suggestedThresholds={"low": 70, "high": 180},
+            modelVersion="fallback_v1",
+            suggestionTimestamp=datetime.utcnow().isoformat() + "Z",
+            confidence=0.8
+        )
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import Dict, Optional
+import os
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Dict, List, Literal, Optional
 
 class Thresholds(BaseModel):
     low: float
@@ -9,4 +11,58 @@ class ThresholdSuggestion(BaseModel):
     suggestedThresholds: Thresholds
     modelVersion: str
     suggestionTimestamp: str
-    confidence: Optional[float] = None
\ No newline at end of file
+    confidence: Optional[float] = None
+
+class ThresholdRequest(BaseModel):
+    userId: str
+    metric: str
+
+# Part of the /ml/personalized_thresholds:batch contract: larger batches are
+# rejected (422) rather than tying up a prediction worker
+MAX_BATCH_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "10000"))
+
+class BatchThresholdRequest(BaseModel):
+    requests: List[ThresholdRequest] = Field(max_length=MAX_BATCH_REQUESTS)
+
+class ProfilingSettings(BaseModel):
+    sampleRate: float = Field(ge=0.0, le=1.0)
+    clear: bool = False
+
+# Evaluation runs off the event loop, but one request still holds a thread
+MAX_BATCH_READINGS = 100000
+
+class ReadingBatch(BaseModel):
+    # Columnar: reading i is (userIds[i], metrics[i], values[i])
+    userIds: List[str] = Field(max_length=MAX_BATCH_READINGS)
+    metrics: List[str] = Field(max_length=MAX_BATCH_READINGS)
+    values: List[float] = Field(max_length=MAX_BATCH_READINGS)
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        if not len(self.userIds) == len(self.metrics) == len(self.values):
+            raise ValueError("userIds, metrics and values must have the same length")
+        return self
+
+class HealthReading(BaseModel):
+    # Same shape as the alert system's HealthDataPoint
+    id: Optional[str] = None
+    userId: str
+    timestamp: int
+    type: str
+    value: float
+    unit: Optional[str] = None
+
+class BehavioralLogEntry(BaseModel):
+    # DIET / MOOD / ACTIVITY log; type-specific fields are stored as sent
+    model_config = ConfigDict(extra="allow")
+
+    id: Optional[str] = None
+    userId: str
+    timestamp: int
+    logType: Literal["DIET", "MOOD", "ACTIVITY"]
+
+class HealthReadingIngest(BaseModel):
+    readings: List[HealthReading]
+
+class BehavioralLogIngest(BaseModel):
+    logs: List[BehavioralLogEntry]
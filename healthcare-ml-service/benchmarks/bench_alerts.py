@@ -0,0 +1,152 @@
+"""Bulk alert evaluation: AlertEngine vs a per-reading port of healthLogicService.
+
+    python -m benchmarks.bench_alerts
+    python -m benchmarks.bench_alerts --users 100000 --readings 200000
+
+A ThresholdTable is filled with random users (some without a threshold
+for a metric, some disallowing or not setting auto-escalation) and random
+readings of every metric the rules cover, including unknown users, are
+evaluated both ways (tests/test_alert_engine.py runs the same check). The levels
+must match exactly before anything is timed.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.alert_engine import AlertEngine, LEVELS
+
+METRICS = ["GLUCOSE", "HEART_RATE", "SPO2", "SLEEP_HOURS", "ACTIVITY_MINUTES"]
+
+
+def reference_level(user, metric, value):
+    """assessSingleDataPointRiskOnServer's level, one reading at a time."""
+    if user is None:
+        return "NONE"
+    threshold = user["thresholds"].get(metric)
+    level = "NONE"
+    if threshold:
+        if metric == "HEART_RATE":
+            if value < threshold["low"]:
+                level = "ESCALATION" if value < threshold["low"] - 15 else "MILD"
+            elif value > threshold["high"]:
+                level = "ESCALATION" if value > threshold["high"] + 25 else "MILD"
+        elif metric == "GLUCOSE":
+            if value < threshold["low"]:
+                level = "ESCALATION" if value < threshold["low"] - 20 else "MILD"
+            elif value > threshold["high"]:
+                level = "ESCALATION" if value > threshold["high"] + 70 else "MILD"
+        elif metric == "SPO2":
+            if value < threshold["low"]:
+                level = "ESCALATION" if value < threshold["low"] - 5 else "MILD"
+        elif metric == "SLEEP_HOURS":
+            if value < threshold["low"] and value > 0:
+                level = "INFO"
+    # !userData.allowAutoEscalation: a missing flag downgrades too
+    if level == "ESCALATION" and not user.get("allowAutoEscalation"):
+        level = "MILD"
+    return level
+
+
+def synthetic_users(n_users, seed=42):
+    rng = np.random.default_rng(seed)
+    users = {}
+    for i in range(n_users):
+        thresholds = {}
+        # Some users lack a threshold for a metric
+        if rng.random() < 0.9:
+            low = float(rng.integers(60, 90))
+            thresholds["GLUCOSE"] = {"low": low, "high": low + float(rng.integers(60, 120))}
+        if rng.random() < 0.9:
+            low = float(rng.integers(45, 65))
+            thresholds["HEART_RATE"] = {"low": low, "high": low + float(rng.integers(40, 60))}
+        if rng.random() < 0.9:
+            thresholds["SPO2"] = {"low": float(rng.integers(88, 95)), "high": 100.0}
+        if rng.random() < 0.9:
+            thresholds["SLEEP_HOURS"] = {"low": float(rng.integers(6, 9))}
+        if rng.random() < 0.9:
+            thresholds["ACTIVITY_MINUTES"] = {"low": 30.0}
+        user = {"id": f"user-{i:06d}", "thresholds": thresholds}
+        # true, false or missing
+        choice = rng.random()
+        if choice < 0.7:
+            user["allowAutoEscalation"] = True
+        elif choice < 0.9:
+            user["allowAutoEscalation"] = False
+        users[user["id"]] = user
+    return users
+
+
+# metric -> value range drawn from, wide enough to land in every band
+VALUE_RANGES = {
+    "GLUCOSE": (20, 320),
+    "HEART_RATE": (20, 160),
+    "SPO2": (70, 101),
+    "SLEEP_HOURS": (-1, 11),
+    "ACTIVITY_MINUTES": (0, 90),
+}
+
+
+def synthetic_readings(user_ids, n_readings, seed=43):
+    rng = np.random.default_rng(seed)
+    ids = list(user_ids) + ["unknown-user"]
+    picked_users = [ids[i] for i in rng.integers(0, len(ids), n_readings)]
+    picked_metrics = [METRICS[i] for i in rng.integers(0, len(METRICS), n_readings)]
+    # Integers, so readings hit the bounds and margins exactly
+    lows = np.array([VALUE_RANGES[m][0] for m in picked_metrics])
+    highs = np.array([VALUE_RANGES[m][1] for m in picked_metrics])
+    values = rng.integers(lows, highs).astype(np.float64)
+    return picked_users, picked_metrics, values
+
+
+def mismatches(engine, users, user_ids, metrics, values):
+    """Positions where the engine's level differs from reference_level."""
+    expected = np.array([reference_level(users.get(u), m, v) for u, m, v in zip(user_ids, metrics, values)],
+                        dtype=object)
+    levels, _, _ = engine.evaluate(user_ids, metrics, values)
+    return np.flatnonzero(LEVELS[levels] != expected), levels, expected
+
+
+def main(n_users=10000, n_readings=200000, repeat=20):
+    users = synthetic_users(n_users)
+    engine = AlertEngine()
+    for user in users.values():
+        engine.table.set_user_document(user)
+    user_ids, metrics, values = synthetic_readings(users, n_readings)
+
+    started = time.perf_counter()
+    [reference_level(users.get(u), m, v) for u, m, v in zip(user_ids, metrics, values)]
+    reference_s = time.perf_counter() - started
+
+    wrong, levels, expected = mismatches(engine, users, user_ids, metrics, values)
+    if len(wrong):
+        i = wrong[0]
+        raise AssertionError(
+            f"AlertEngine differs from healthLogicService on {len(wrong)} readings, e.g. "
+            f"{user_ids[i]} {metrics[i]}={values[i]}: {LEVELS[levels[i]]} != {expected[i]}"
+        )
+
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        started = time.perf_counter()
+        engine.evaluate(user_ids, metrics, values)
+        samples[i] = time.perf_counter() - started
+    return {
+        "users": n_users,
+        "readings": n_readings,
+        "level_counts": {str(level): int(count) for level, count in zip(*np.unique(LEVELS[levels], return_counts=True))},
+        "reference_ms": reference_s * 1000,
+        "engine_p50_ms": float(np.percentile(samples, 50) * 1000),
+        "engine_max_ms": float(samples.max() * 1000),
+        "speedup_p50": reference_s / float(np.percentile(samples, 50)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bulk alert evaluation against the TypeScript rules")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(main(args.users, args.readings, args.repeat), indent=2))
@@ -0,0 +1,106 @@
+"""Per-call inference latency: pyfunc wrapper vs native sklearn vs CompiledForest.
+
+    python -m benchmarks.bench_inference
+    python -m benchmarks.bench_inference --model-uri models:/threshold_GLUCOSE@champion
+
+Without --model-uri a forest shaped like the production one (100 trees,
+six features, two targets) is fit on synthetic data and saved to a
+temporary directory, so no tracking server is needed.
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import mlflow
+import mlflow.sklearn
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from app.compiled_forest import CompiledForest
+from app.feature_engineer import FEATURE_NAMES
+
+
+def synthetic_model(n_estimators=100, n_users=2000, seed=42):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(18, 90, n_users),       # age
+        rng.normal(120, 25, n_users),        # mean
+        rng.gamma(2.0, 8.0, n_users),        # std
+        rng.poisson(1.0, n_users),           # false_alarms
+        rng.poisson(5.0, n_users),           # high_carb_meals
+        rng.poisson(3.0, n_users),           # stress_events
+    ]).astype(np.float64)
+    y = np.column_stack([X[:, 1] - 1.6 * X[:, 2], X[:, 1] + 1.6 * X[:, 2]]) + rng.normal(0, 5, (n_users, 2))
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=seed).fit(X, y)
+    return model, X
+
+
+def time_calls(fn, repeat):
+    fn()  # first call builds caches/buffers
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    return {
+        "p50_us": float(np.percentile(samples, 50) * 1e6),
+        "p99_us": float(np.percentile(samples, 99) * 1e6),
+        "mean_us": float(samples.mean() * 1e6),
+    }
+
+
+def main(model_uri=None, repeat=2000, batch_size=100):
+    with tempfile.TemporaryDirectory() as tmp:
+        if model_uri is None:
+            model, X = synthetic_model()
+            model_uri = f"{tmp}/model"
+            mlflow.sklearn.save_model(
+                model, model_uri, serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE
+            )
+        else:
+            model = mlflow.sklearn.load_model(model_uri)
+            X = np.random.default_rng(0).normal(100, 20, (batch_size, len(FEATURE_NAMES)))
+        pyfunc_model = mlflow.pyfunc.load_model(model_uri)
+        native_model = mlflow.sklearn.load_model(model_uri)
+    compiled = CompiledForest.from_sklearn(native_model)
+
+    row_list = [X[0].tolist()]
+    row = np.ascontiguousarray(X[:1])
+    batch = np.ascontiguousarray(X[:batch_size])
+    # Models are logged without a signature, so pyfunc gets a list like before
+    cases = {
+        "pyfunc_single": lambda: pyfunc_model.predict(row_list),
+        "native_single": lambda: native_model.predict(row),
+        "compiled_single": lambda: compiled.predict(row),
+        "pyfunc_batch": lambda: pyfunc_model.predict(pd.DataFrame(batch)),
+        "native_batch": lambda: native_model.predict(batch),
+        "compiled_batch": lambda: compiled.predict(batch),
+    }
+
+    if not np.allclose(compiled.predict(batch), native_model.predict(batch), rtol=0, atol=1e-9):
+        raise AssertionError("CompiledForest predictions differ from sklearn")
+
+    results = {
+        "model_uri": model_uri,
+        "trees": len(compiled.roots),
+        "max_depth": compiled.max_depth,
+        "batch_size": batch_size,
+        "latency": {name: time_calls(fn, repeat) for name, fn in cases.items()},
+    }
+    baseline = results["latency"]["pyfunc_single"]["p50_us"]
+    results["speedup_single_p50"] = {
+        name: baseline / stats["p50_us"]
+        for name, stats in results["latency"].items() if name.endswith("_single")
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-call model inference latency")
+    parser.add_argument("--model-uri", help="MLflow model URI (default: synthetic forest)")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(main(args.model_uri, args.repeat, args.batch_size), indent=2))
@@ -0,0 +1,224 @@
+"""End-to-end service benchmark: /ml/personalized_thresholds latency/throughput and training cost.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_service --users 100 1000 --concurrency 1 8 32 --output bench.json
+
+For each data volume the synthetic generator fills an in-memory Mongo
+(mongomock), train_model.main trains and registers every metric in a
+throwaway SQLite MLflow registry (wall-clock, then tracemalloc peak in a
+second run), and the FastAPI app is driven in-process over ASGI at each
+concurrency level with the feature cache disabled. mongomock filters in
+Python, so "documents" mode numbers are dominated by the stand-in; "store"
+mode (the default) touches Mongo only at startup. The aggregate mode needs
+$lookup pipelines mongomock lacks and is not supported here.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import asyncio
+import platform
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+try:
+    import httpx
+    import mongomock
+except ImportError as e:
+    raise SystemExit(f"{e}; install the benchmark extras: pip install -r benchmarks/requirements.txt")
+
+import pymongo
+from mongomock.collection import Cursor
+
+# Everything below must see the stand-in and the throwaway registry
+pymongo.MongoClient = mongomock.MongoClient
+# mongomock re-slices the whole result list on every next(), making each
+# loop over a cursor quadratic; iterate the computed results once instead
+Cursor.__iter__ = lambda cursor: iter(cursor._compute_results(with_limit_and_skip=True)[cursor._emitted:])
+_registry_dir = tempfile.mkdtemp(prefix="bench-mlflow-")
+os.environ["MLFLOW_TRACKING_URI"] = f"sqlite:///{_registry_dir}/mlflow.db"
+os.environ["MODEL_POLL_SECONDS"] = "0"
+os.environ.setdefault("MODEL_ALIAS", "champion")
+
+from app.api import app, predictor  # noqa: E402
+from app.feature_store import RollingFeatureStore  # noqa: E402
+from generate_data import generate_users  # noqa: E402
+from training import train_model  # noqa: E402
+from mlflow.tracking import MlflowClient  # noqa: E402
+
+
+class _AsyncCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+
+class _AsyncCollection:
+    """Just enough of AsyncCollection for AsyncMongoDBLoader's find paths."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self.collection.find(*args, **kwargs))
+
+
+class _AsyncDatabase:
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        return _AsyncCollection(self.db[name])
+
+
+def seed_data(db, users, days, seed):
+    for collection in ("users", "healthdata", "behaviorallogs", "alerts", "thresholdsuggestions"):
+        db[collection].drop()
+    config = {
+        "days": days, "now_ms": int(time.time() * 1000),
+        "glucose_per_day": 6, "heart_rate_per_day": 24, "meals_per_day": 2.8,
+        "alerts_per_day": 0.5, "feedback_rate": 0.6, "false_alarm_rate": 0.3,
+    }
+    docs = generate_users(1, users, config, seed)
+    for collection, collection_docs in docs.items():
+        for start in range(0, len(collection_docs), 10000):
+            db[collection].insert_many(collection_docs[start:start + 10000])
+    return {collection: len(collection_docs) for collection, collection_docs in docs.items()}
+
+
+def bench_training(db, metrics):
+    results = []
+    for metric in metrics:
+        started = time.perf_counter()
+        train_model.main(metric, db=db)
+        wall_seconds = time.perf_counter() - started
+
+        # Separate traced run: tracemalloc slows the timed one down
+        tracemalloc.start()
+        train_model.main(metric, db=db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append({
+            "metric": metric,
+            "wall_seconds": wall_seconds,
+            "peak_traced_mb": peak / 2**20,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        })
+    return results
+
+
+async def drive(keys, concurrency, n_requests):
+    latencies, fallbacks, errors = [], 0, 0
+    indices = iter(range(n_requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal fallbacks, errors
+            # The iterator is shared, so workers split the requests between them
+            for i in indices:
+                user_id, metric = keys[i % len(keys)]
+                started = time.perf_counter()
+                response = await client.get("/ml/personalized_thresholds", params={"userId": user_id, "metric": metric})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+                elif response.json()["modelVersion"] == "fallback_v1":
+                    fallbacks += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "rps": n_requests / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "fallbacks": fallbacks,
+        "errors": errors,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main(users=(100, 1000), days=30, concurrency=(1, 8, 32), requests=2000, feature_mode="store",
+         seed=42, output=None):
+    metrics = list(predictor.metric_models)
+    db = predictor.data_loader.db
+    predictor.async_data_loader.db = _AsyncDatabase(db)
+    predictor.feature_mode = feature_mode
+    # Measure the live path: no cache hits, no precomputed suggestions
+    predictor.cache.max_entries = 0
+    predictor.precomputed_max_age = None
+    # Artifacts next to the throwaway registry, not in ./mlruns
+    client = MlflowClient()
+    for metric in metrics:
+        client.create_experiment(f"threshold_{metric}", artifact_location=f"{_registry_dir}/artifacts")
+
+    report = {
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {"days": days, "requests": requests, "feature_mode": feature_mode, "seed": seed},
+        "runs": [],
+    }
+    for n_users in users:
+        counts = seed_data(db, n_users, days, seed)
+        print(f"Seeded {n_users} users: {counts}")
+        training = bench_training(db, metrics)
+
+        predictor.refresh_models()
+        predictor.feature_store = RollingFeatureStore()
+        if feature_mode == "store":
+            predictor.feature_store.load(db, metrics)
+        if not predictor.warm_up():
+            raise SystemExit(f"Models failed to load: {predictor.model_status()}")
+
+        rng = random.Random(seed)
+        keys = [(f"user-{rng.randint(1, n_users):03d}", rng.choice(metrics)) for _ in range(requests)]
+        serving = []
+        for level in concurrency:
+            result = asyncio.run(drive(keys, level, requests))
+            print(f"{n_users} users, concurrency {level}: {result['rps']:.0f} req/s, "
+                  f"p50 {result['p50_ms']:.2f}ms p99 {result['p99_ms']:.2f}ms")
+            serving.append(result)
+        report["runs"].append({"users": n_users, "documents": counts, "training": training, "serving": serving})
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the threshold service and training")
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000], help="data volumes to run")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--feature-mode", choices=["store", "documents"], default="store")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_service.json", help="JSON report path")
+    args = parser.parse_args()
+    main(args.users, args.days, args.concurrency, args.requests, args.feature_mode, args.seed, args.output)
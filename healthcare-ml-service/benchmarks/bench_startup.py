@@ -0,0 +1,154 @@
+"""Service startup cost: import time, time to live and time to ready, in fresh processes.
+
+    python -m benchmarks.bench_startup --runs 5 --output bench_startup.json
+    python -m benchmarks.bench_startup --tracking-uri http://127.0.0.1:1   # registry down: live, never ready
+
+Each run starts a new interpreter that imports app.api, enters the app's
+lifespan and polls /live and /ready over ASGI. "live_s" is measured from
+process spawn, so it includes interpreter startup. Without --tracking-uri
+a synthetic forest is registered for every metric in a throwaway SQLite
+registry; nothing at startup touches Mongo in the default feature mode,
+so --mongo-uri can point nowhere. A separate -X importtime run lists the
+modules that dominate import time.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+
+import numpy as np
+
+PROBE = r"""
+import os, sys, json, time, asyncio
+spawned = float(os.environ["BENCH_SPAWNED"])
+started = time.perf_counter()
+import app.api as api
+imported = time.perf_counter()
+import httpx
+
+async def probe():
+    result = {"import_s": imported - started}
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.app.router.lifespan_context(api.app):
+        result["lifespan_s"] = time.perf_counter() - imported
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            result["live_status"] = (await client.get("/live")).status_code
+            result["live_s"] = time.time() - spawned
+            deadline = time.perf_counter() + float(os.environ["BENCH_READY_TIMEOUT"])
+            result["ready_s"] = None
+            while time.perf_counter() < deadline:
+                if (await client.get("/ready")).status_code == 200:
+                    result["ready_s"] = time.time() - spawned
+                    break
+                await asyncio.sleep(0.01)
+    return result
+
+print(json.dumps(asyncio.run(probe())))
+"""
+
+
+def register_synthetic_models(registry_dir, metrics):
+    """Register one synthetic forest per metric in a SQLite registry under registry_dir."""
+    import mlflow
+    import mlflow.sklearn
+    from mlflow.tracking import MlflowClient
+    from benchmarks.bench_inference import synthetic_model
+
+    tracking_uri = f"sqlite:///{registry_dir}/mlflow.db"
+    mlflow.set_tracking_uri(tracking_uri)
+    model, _ = synthetic_model()
+    client = MlflowClient()
+    for metric, model_name in metrics.items():
+        # Artifacts next to the registry, not in ./mlruns
+        experiment_id = client.create_experiment(f"threshold_{metric}", artifact_location=f"{registry_dir}/artifacts")
+        with mlflow.start_run(experiment_id=experiment_id):
+            info = mlflow.sklearn.log_model(
+                model, "model", serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE
+            )
+        version = mlflow.register_model(info.model_uri, model_name)
+        client.set_registered_model_alias(model_name, "champion", version.version)
+    return tracking_uri
+
+
+def run_once(env, ready_timeout):
+    env = dict(env, BENCH_SPAWNED=repr(time.time()), BENCH_READY_TIMEOUT=str(ready_timeout))
+    proc = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"Startup probe failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def import_profile(env, top=15):
+    """Modules with the largest cumulative import time (-X importtime)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.api"],
+                          env=env, capture_output=True, text=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules.append((parts[2].strip(), int(parts[1]) / 1e6))
+    return [{"module": name, "cumulative_s": seconds}
+            for name, seconds in sorted(modules, key=lambda m: m[1], reverse=True)[:top]]
+
+
+def _summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"p50": float(np.percentile(values, 50)), "max": float(max(values))}
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main(runs=5, tracking_uri=None, mongo_uri="mongodb://127.0.0.1:1", ready_timeout=60.0, output=None):
+    from app.model_predictor import METRIC_MODELS
+
+    env = dict(os.environ, MONGO_URI=mongo_uri, MODEL_POLL_SECONDS="0", MODEL_ALIAS="champion")
+    env.pop("MODEL_SHARE_DIR", None)
+    if tracking_uri is None:
+        tracking_uri = register_synthetic_models(tempfile.mkdtemp(prefix="bench-startup-"), METRIC_MODELS)
+    env["MLFLOW_TRACKING_URI"] = tracking_uri
+
+    results = []
+    for i in range(runs):
+        result = run_once(env, ready_timeout)
+        ready = f"{result['ready_s']:.2f}s" if result["ready_s"] is not None else "not ready"
+        print(f"run {i + 1}: import {result['import_s']:.3f}s, live {result['live_s']:.3f}s, ready {ready}")
+        results.append(result)
+
+    report = {
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {"runs": runs, "tracking_uri": tracking_uri, "mongo_uri": mongo_uri},
+        "import_s": _summary([r["import_s"] for r in results]),
+        "live_s": _summary([r["live_s"] for r in results]),
+        "ready_s": _summary([r["ready_s"] for r in results]),
+        "runs": results,
+        "import_profile": import_profile(env),
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark service import and cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tracking-uri", default=None, help="existing registry (default: throwaway SQLite with synthetic models)")
+    parser.add_argument("--mongo-uri", default="mongodb://127.0.0.1:1")
+    parser.add_argument("--ready-timeout", type=float, default=60.0, help="seconds to wait for /ready")
+    parser.add_argument("--output", default="bench_startup.json", help="JSON report path")
+    args = parser.parse_args()
+    main(args.runs, args.tracking_uri, args.mongo_uri, args.ready_timeout, args.output)
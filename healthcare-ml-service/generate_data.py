@@ -1,94 +1,215 @@
+"""Synthetic workload generator: users, health data, behavioral logs and alert feedback.
+
+    python generate_data.py                                  # 5 users x 30 days into MongoDB
+    python generate_data.py --users 100000 --days 30 --drop --indexes
+    python generate_data.py --users 100000 --output files --out-dir ./synthetic --format parquet
+
+Users are split into tasks of --users-per-task and generated by worker
+processes. Each task samples every document field with NumPy in one shot
+and writes with unordered, chunked insert_many (or one part file per task
+and collection). Each user gets a personal baseline and spread per metric,
+so the personalized thresholds have something to learn.
+"""
 import os
-import random
+import json
 import time
-from datetime import datetime, timedelta
-from pymongo import MongoClient
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
+from pymongo import MongoClient
 
 load_dotenv()
 
-# Connect to MongoDB
-client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
-db = client["healthcompanion"]
-
-# Number of synthetic users to create
-NUM_USERS = 5
-
-# How many days of data to generate per user
-DAYS = 30
-
-# Base timestamp: now
-now = datetime.now()
-
-# Function to generate health data for a day for a given user
-def generate_health_data_for_day(user_id, day_offset):
-    base_timestamp = now - timedelta(days=day_offset)
-    data = []
-    
-    # Glucose (4-8 readings per day)
-    for _ in range(random.randint(4, 8)):
-        timestamp = base_timestamp + timedelta(hours=random.randint(0,23), minutes=random.randint(0,59))
-        data.append({
-            "userId": user_id,
-            "timestamp": int(timestamp.timestamp() * 1000),
-            "type": "GLUCOSE",
-            "value": random.randint(70, 200),
-            "unit": "mg/dL"
-        })
-    
-    # Heart rate (continuous monitoring - 24 readings)
-    for hour in range(0, 24):
-        timestamp = base_timestamp + timedelta(hours=hour)
-        data.append({
-            "userId": user_id,
-            "timestamp": int(timestamp.timestamp() * 1000),
-            "type": "HEART_RATE",
-            "value": random.randint(60, 100),
-            "unit": "bpm"
-        })
-    
-    return data
-
-# Function to generate behavioral logs for a day for a given user
-def generate_behavioral_logs_for_day(user_id, day_offset):
-    base_timestamp = now - timedelta(days=day_offset)
-    logs = []
-    
-    # Mood log
-    logs.append({
-        "userId": user_id,
-        "timestamp": int((base_timestamp + timedelta(hours=18)).timestamp() * 1000),
-        "logType": "MOOD",
-        "moodType": random.choice(["Happy", "Normal", "Stressed", "Tired"])
-    })
-    
-    # Diet logs (2-4 per day)
-    for meal in ["Breakfast", "Lunch", "Dinner", "Snack"]:
-        if random.random() > 0.3:  # 70% chance to log each meal type
-            logs.append({
-                "userId": user_id,
-                "timestamp": int((base_timestamp + timedelta(hours=random.randint(7,20))).timestamp() * 1000),
-                "logType": "DIET",
-                "dietType": meal
-            })
-    
-    return logs
-
-# Generate and insert data for each user
-for user_num in range(1, NUM_USERS + 1):
-    user_id = f"user-{user_num:03d}"
-    
-    all_health_data = []
-    all_behavioral_logs = []
-    
-    for day in range(DAYS):
-        all_health_data.extend(generate_health_data_for_day(user_id, day))
-        all_behavioral_logs.extend(generate_behavioral_logs_for_day(user_id, day))
-    
-    # Insert into MongoDB
-    if all_health_data:
-        db.healthdata.insert_many(all_health_data)
-    if all_behavioral_logs:
-        db.behaviorallogs.insert_many(all_behavioral_logs)
-    
-    print(f"Inserted for {user_id}: {len(all_health_data)} health records and {len(all_behavioral_logs)} behavioral logs")
+DB_NAME = "healthcompanion"
+COLLECTIONS = ["users", "healthdata", "behaviorallogs", "alerts"]
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Same category values the alert system writes (server/src/types.ts)
+DIET_TYPES = ["Low Carb Meal", "Balanced Meal", "High Carb Meal", "Light Snack", "Heavy Snack", "Fasting"]
+MOOD_TYPES = ["Happy", "Calm", "Stressed", "Anxious", "Sad", "Energetic"]
+FEEDBACK_TYPES = ["DISMISSED_ACKNOWLEDGED", "DISMISSED_EXPECTED", "DISMISSED_FALSE_ALARM"]
+
+# metric -> (unit, population mean/std of a user's baseline, mean within-user spread, clip range)
+METRICS = {
+    "GLUCOSE": ("mg/dL", 130, 20, 25, (40, 400)),
+    "HEART_RATE": ("bpm", 75, 8, 10, (35, 200)),
+}
+
+_client = None
+
+
+def get_db():
+    # One client per worker process
+    global _client
+    if _client is None:
+        _client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    return _client[DB_NAME]
+
+
+def generate_users(first_user, n_users, config, seed):
+    """All documents for users first_user .. first_user + n_users - 1, per collection."""
+    rng = np.random.default_rng(seed)
+    days = config["days"]
+    user_nums = np.arange(first_user, first_user + n_users)
+    user_ids = np.array([f"user-{n:03d}" for n in user_nums], dtype=object)
+    ages = rng.integers(18, 90, n_users)
+    # Whole days ending at the start of today, so nothing is in the future
+    window_start = (config["now_ms"] // DAY_MS - days) * DAY_MS
+
+    docs = {"users": [
+        {"id": user_id, "name": f"Synthetic User {n}", "age": age, "allowAutoEscalation": True}
+        for user_id, n, age in zip(user_ids.tolist(), user_nums.tolist(), ages.tolist())
+    ]}
+
+    healthdata = []
+    for metric, per_day in (("GLUCOSE", config["glucose_per_day"]), ("HEART_RATE", config["heart_rate_per_day"])):
+        unit, mean, spread, within, (low, high) = METRICS[metric]
+        baseline = rng.normal(mean, spread, n_users)
+        scale = rng.gamma(4.0, within / 4.0, n_users)
+        counts = rng.poisson(per_day * days, n_users)
+        owner = np.repeat(np.arange(n_users), counts)
+        values = np.clip(np.rint(rng.normal(baseline[owner], scale[owner])), low, high).astype(np.int64)
+        timestamps = _timestamps(rng, window_start, days, len(owner))
+        healthdata += [
+            {"userId": user_id, "timestamp": ts, "type": metric, "value": value, "unit": unit}
+            for user_id, ts, value in zip(user_ids[owner].tolist(), timestamps.tolist(), values.tolist())
+        ]
+    docs["healthdata"] = healthdata
+
+    # One mood log and ~meals_per_day diet logs per user-day; users differ in habits
+    mood_p = rng.dirichlet(np.ones(len(MOOD_TYPES)), n_users)
+    diet_p = rng.dirichlet(np.ones(len(DIET_TYPES)), n_users)
+    mood_owner = np.repeat(np.arange(n_users), days)
+    diet_owner = np.repeat(np.arange(n_users), rng.poisson(config["meals_per_day"] * days, n_users))
+    moods = _choose(rng, mood_p[mood_owner], MOOD_TYPES)
+    diets = _choose(rng, diet_p[diet_owner], DIET_TYPES)
+    docs["behaviorallogs"] = [
+        {"userId": user_id, "timestamp": ts, "logType": "MOOD", "moodType": mood}
+        for user_id, ts, mood in zip(user_ids[mood_owner].tolist(),
+                                     _timestamps(rng, window_start, days, len(mood_owner)).tolist(), moods)
+    ] + [
+        {"userId": user_id, "timestamp": ts, "logType": "DIET", "dietType": diet}
+        for user_id, ts, diet in zip(user_ids[diet_owner].tolist(),
+                                     _timestamps(rng, window_start, days, len(diet_owner)).tolist(), diets)
+    ]
+
+    alerts = []
+    for metric in METRICS:
+        owner = np.repeat(np.arange(n_users), rng.poisson(config["alerts_per_day"] * days, n_users))
+        timestamps = _timestamps(rng, window_start, days, len(owner))
+        has_feedback = rng.random(len(owner)) < config["feedback_rate"]
+        false_alarm_rate = config["false_alarm_rate"]
+        other_rate = (1 - false_alarm_rate) / 2
+        feedback = _choose(rng, np.tile([other_rate, other_rate, false_alarm_rate], (len(owner), 1)), FEEDBACK_TYPES)
+        for user_id, ts, answered, user_feedback in zip(
+                user_ids[owner].tolist(), timestamps.tolist(), has_feedback.tolist(), feedback):
+            alert = {"userId": user_id, "timestamp": ts, "level": "MILD", "metricType": metric,
+                     "message": f"{metric} outside threshold", "isDismissed": answered}
+            if answered:
+                alert["userFeedback"] = user_feedback
+            alerts.append(alert)
+    docs["alerts"] = alerts
+    return docs
+
+
+def _timestamps(rng, window_start, days, n):
+    return window_start + rng.integers(0, days * DAY_MS, n)
+
+
+def _choose(rng, probabilities, labels):
+    # Row-wise categorical sampling: one uniform per row against the CDF
+    cdf = np.cumsum(probabilities, axis=1)
+    picks = (rng.random((len(cdf), 1)) > cdf).sum(axis=1)
+    return np.asarray(labels, dtype=object)[np.minimum(picks, len(labels) - 1)].tolist()
+
+
+def run_task(task, first_user, n_users, config, seed):
+    docs = generate_users(first_user, n_users, config, seed)
+    if config["output"] == "mongo":
+        db = get_db()
+        chunk_size = config["chunk_size"]
+        for collection, collection_docs in docs.items():
+            for start in range(0, len(collection_docs), chunk_size):
+                db[collection].insert_many(collection_docs[start:start + chunk_size], ordered=False)
+    else:
+        for collection, collection_docs in docs.items():
+            directory = os.path.join(config["out_dir"], collection)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{task:05d}.{config['format']}")
+            if config["format"] == "parquet":
+                pd.DataFrame(collection_docs).to_parquet(path, index=False)
+            else:
+                # Per document, so absent fields (e.g. userFeedback) stay absent rather than null
+                with open(path, "w") as f:
+                    f.writelines(json.dumps(doc) + "\n" for doc in collection_docs)
+    return {collection: len(collection_docs) for collection, collection_docs in docs.items()}
+
+
+def main(users=5, days=30, glucose_per_day=6, heart_rate_per_day=24, meals_per_day=2.8,
+         alerts_per_day=0.5, feedback_rate=0.6, false_alarm_rate=0.3, output="mongo",
+         out_dir="synthetic", format="jsonl", workers=None, users_per_task=500, chunk_size=10000,
+         seed=42, drop=False, indexes=False):
+    started = time.perf_counter()
+    config = {
+        "days": days, "now_ms": int(time.time() * 1000),
+        "glucose_per_day": glucose_per_day, "heart_rate_per_day": heart_rate_per_day,
+        "meals_per_day": meals_per_day, "alerts_per_day": alerts_per_day,
+        "feedback_rate": feedback_rate, "false_alarm_rate": false_alarm_rate,
+        "output": output, "out_dir": out_dir, "format": format, "chunk_size": chunk_size,
+    }
+    if output == "mongo" and drop:
+        for collection in COLLECTIONS:
+            get_db()[collection].drop()
+
+    tasks = [(first, min(users_per_task, users - first + 1)) for first in range(1, users + 1, users_per_task)]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    totals = dict.fromkeys(COLLECTIONS, 0)
+    workers = workers or os.cpu_count() or 1
+    # spawn: workers must not inherit the parent's MongoClient threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        futures = [
+            pool.submit(run_task, task, first, n, config, task_seed)
+            for task, ((first, n), task_seed) in enumerate(zip(tasks, seeds))
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            for collection, count in future.result().items():
+                totals[collection] += count
+            if done % max(1, len(futures) // 10) == 0 or done == len(futures):
+                print(f"{done}/{len(futures)} tasks, {totals['healthdata']} health records so far")
+
+    if output == "mongo" and indexes:
+        # Built once after the load instead of maintained per insert
+        from app.indexes import ensure_indexes
+        ensure_indexes(get_db())
+
+    elapsed = time.perf_counter() - started
+    print(f"Generated {totals} in {elapsed:.1f}s "
+          f"({sum(totals.values()) / elapsed:,.0f} docs/s, {workers} workers)")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic health data")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--glucose-per-day", type=float, default=6, help="mean glucose readings per user-day")
+    parser.add_argument("--heart-rate-per-day", type=float, default=24, help="mean heart-rate readings per user-day")
+    parser.add_argument("--meals-per-day", type=float, default=2.8, help="mean diet logs per user-day")
+    parser.add_argument("--alerts-per-day", type=float, default=0.5, help="mean alerts per user-day and metric")
+    parser.add_argument("--feedback-rate", type=float, default=0.6, help="fraction of alerts with userFeedback")
+    parser.add_argument("--false-alarm-rate", type=float, default=0.3, help="fraction of feedback that is a false alarm")
+    parser.add_argument("--output", choices=["mongo", "files"], default="mongo")
+    parser.add_argument("--out-dir", default="synthetic", help="directory for --output files")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl", help="file format (parquet needs pyarrow)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--users-per-task", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=10000, help="documents per insert_many")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="drop the collections first")
+    parser.add_argument("--indexes", action="store_true", help="create app.indexes indexes after loading")
+    args = parser.parse_args()
+    main(**{name: value for name, value in vars(args).items()})
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from app.alert_engine import AlertEngine, LEVELS
+from benchmarks.bench_alerts import mismatches, synthetic_readings, synthetic_users
+
+
+def _engine(users):
+    engine = AlertEngine()
+    for user in users.values():
+        engine.table.set_user_document(user)
+    return engine
+
+
+def test_matches_health_logic_service():
+    users = synthetic_users(2000)
+    user_ids, metrics, values = synthetic_readings(users, 50000)
+    wrong, levels, expected = mismatches(_engine(users), users, user_ids, metrics, values)
+    assert len(wrong) == 0, [(user_ids[i], metrics[i], values[i], LEVELS[levels[i]], expected[i]) for i in wrong[:5]]
+    # Every level is exercised
+    assert set(expected) == {"NONE", "INFO", "MILD", "ESCALATION"}
+
+
+def test_spo2_and_sleep_rules():
+    users = {"u": {"id": "u", "allowAutoEscalation": True, "thresholds": {
+        "SPO2": {"low": 92, "high": 100}, "SLEEP_HOURS": {"low": 7}}}}
+    levels, _, _ = _engine(users).evaluate(["u"] * 4, ["SPO2", "SPO2", "SLEEP_HOURS", "SLEEP_HOURS"], [80, 90, 5, 0])
+    assert LEVELS[levels].tolist() == ["ESCALATION", "MILD", "INFO", "NONE"]
+
+
+def test_missing_allow_auto_escalation_downgrades():
+    users = {"u": {"id": "u", "thresholds": {"SPO2": {"low": 92, "high": 100}}}}
+    levels, _, _ = _engine(users).evaluate(["u"], ["SPO2"], [80])
+    assert LEVELS[levels].tolist() == ["MILD"]
+
+
+def test_unsupported_metric_is_rejected():
+    with pytest.raises(ValueError):
+        _engine({}).evaluate(["u"], ["BLOOD_PRESSURE"], np.array([120.0]))
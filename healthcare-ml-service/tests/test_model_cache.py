@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+from sklearn.tree import DecisionTreeRegressor
+
+from app.compiled_forest import CompiledForest
+from app.model_cache import SharedModelCache
+
+
+def _forest(seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(50, 3))
+    return CompiledForest.from_sklearn(DecisionTreeRegressor(max_depth=3).fit(X, X[:, 0]))
+
+
+def _versions(directory, model_name="m"):
+    return sorted(name for name in os.listdir(os.path.join(directory, model_name)) if name.isdigit())
+
+
+def test_rollback_to_older_version_is_kept(tmp_path):
+    cache = SharedModelCache(str(tmp_path), keep=2)
+    cache.put("m", "5", _forest(5))
+    cache.put("m", "4", _forest(4))
+
+    # Alias rolled back 5 -> 3: the version just written must survive pruning
+    forest = _forest(3)
+    shared = cache.put("m", "3", forest)
+    X = np.zeros((2, 3))
+    np.testing.assert_array_equal(shared.predict(X), forest.predict(X))
+    assert cache.get("m", "3") is not None
+    assert _versions(tmp_path) == ["3", "4"]
+
+
+def test_prune_keeps_most_recently_used(tmp_path):
+    cache = SharedModelCache(str(tmp_path), keep=2)
+    cache.put("m", "1", _forest(1))
+    cache.put("m", "2", _forest(2))
+    # Version 1 mapped again (e.g. by a worker serving it) counts as used
+    os.utime(os.path.join(tmp_path, "m", "2"), ns=(0, 0))
+    cache.get("m", "1")
+    cache.put("m", "3", _forest(3))
+    assert _versions(tmp_path) == ["1", "3"]
+
+
+def test_get_missing_version(tmp_path):
+    cache = SharedModelCache(str(tmp_path))
+    assert cache.get("m", "7") is None
@@ -0,0 +1,17 @@
+import pytest
+from pydantic import ValidationError
+
+from app.schemas import MAX_BATCH_REQUESTS, BatchThresholdRequest
+
+
+def _batch(n):
+    return {"requests": [{"userId": f"user-{i}", "metric": "GLUCOSE"} for i in range(n)]}
+
+
+def test_batch_accepts_up_to_the_cap():
+    assert len(BatchThresholdRequest.model_validate(_batch(MAX_BATCH_REQUESTS)).requests) == MAX_BATCH_REQUESTS
+
+
+def test_batch_over_the_cap_is_rejected():
+    with pytest.raises(ValidationError):
+        BatchThresholdRequest.model_validate(_batch(MAX_BATCH_REQUESTS + 1))
@@ -0,0 +1,200 @@
+"""Single-pass, vectorized training dataset builder.
+
+Each collection is streamed once with a projection and a large cursor batch
+size, converted chunk by chunk into columnar pandas frames, and reduced with
+grouped vectorized operations. Memory is bounded by the chunk size plus one
+summary row per user: readings are streamed sorted by userId (served by the
+userId_type_timestamp index from app.indexes), so each chunk's users are
+complete and summarized, 5th/95th percentile targets included, before the
+next chunk is read.
+
+Every function also accepts a training.snapshot.Snapshot in place of ``db``:
+the same queries are then answered from its columnar files, and windows end
+at the snapshot time.
+"""
+import numpy as np
+import pandas as pd
+
+from app.feature_engineer import (
+    FEATURE_NAMES, HIGH_CARB_DIET, STRESSED_MOOD, FALSE_ALARM_FEEDBACK,
+    feature_frame_from_aggregates,
+)
+from app.feature_store import window_start_ms
+from training.snapshot import Snapshot
+
+TARGET_NAMES = ["low_target", "high_target"]
+
+DEFAULT_CHUNK_SIZE = 500_000
+
+
+def build_dataset(db, metric, window_days=30, alert_window_days=90, chunk_size=DEFAULT_CHUNK_SIZE, shared=None):
+    """One row per user with readings for ``metric``: FEATURE_NAMES + TARGET_NAMES.
+
+    Windows use the same whole-day boundaries as RollingFeatureStore, so the
+    features equal what the predictor serves in store mode. ``shared`` is the
+    result of extract_shared(), for callers building several metrics.
+    """
+    reading_cutoff = window_start_ms(window_days, _now_ms(db))
+    readings = reading_stats(db, metric, reading_cutoff, chunk_size)
+    if readings.empty:
+        return pd.DataFrame(columns=FEATURE_NAMES + TARGET_NAMES)
+
+    features = build_features(db, metric, window_days, alert_window_days, chunk_size, shared, readings)
+    # Inner join on users: readings from unknown users are not scorable
+    return readings[TARGET_NAMES].join(features, how="inner")[FEATURE_NAMES + TARGET_NAMES]
+
+
+def build_features(db, metric, window_days=30, alert_window_days=90, chunk_size=DEFAULT_CHUNK_SIZE,
+                   shared=None, readings=None):
+    """FEATURE_NAMES for every user, indexed by userId.
+
+    Users without readings get the same zero mean/std the predictor uses.
+    ``readings`` is a reading_stats() result to reuse.
+    """
+    if readings is None:
+        readings = reading_stats(db, metric, window_start_ms(window_days, _now_ms(db)), chunk_size)
+    if shared is None:
+        shared = extract_shared(db, window_days, chunk_size)
+    alerts = alert_stats(db, metric, window_start_ms(alert_window_days, _now_ms(db)), chunk_size)
+
+    frame = shared["users"].join(readings[["count", "total", "total_sq"]]).join(shared["logs"]).join(alerts)
+    counts = ["count", "false_alarms", "high_carb_meals", "stress_events"]
+    frame[counts] = frame[counts].fillna(0).astype(np.int64)
+    frame[["total", "total_sq"]] = frame[["total", "total_sq"]].fillna(0.0)
+    return feature_frame_from_aggregates(frame)
+
+
+def extract_shared(db, window_days=30, chunk_size=DEFAULT_CHUNK_SIZE):
+    """The metric-independent inputs: user ages and behavioral-log counts."""
+    if _is_snapshot(db):
+        users = db.users()
+    else:
+        users = pd.DataFrame(
+            [(u["id"], u.get("age")) for u in db.users.find({}, {"_id": 0, "id": 1, "age": 1}).batch_size(chunk_size)],
+            columns=["userId", "age"],
+        )
+    users = users.drop_duplicates("userId").set_index("userId")
+    logs = behavioral_stats(db, window_start_ms(window_days, _now_ms(db)), chunk_size)
+    return {"users": users, "logs": logs}
+
+
+def _is_snapshot(db):
+    return isinstance(db, Snapshot)
+
+
+def _now_ms(db):
+    # None: now
+    return db.as_of_ms if _is_snapshot(db) else None
+
+
+def reading_stats(db, metric, cutoff, chunk_size=DEFAULT_CHUNK_SIZE):
+    """count/total/total_sq and percentile targets per user, one sorted pass."""
+    if _is_snapshot(db):
+        summaries = [_summarize_readings(user_ids, values)
+                     for user_ids, values in db.reading_chunks(metric, cutoff, chunk_size)]
+        # Chunks are user groups, not userId ranges: restore the Mongo path's order
+        return _concat_readings(summaries).sort_index()
+
+    cursor = db.healthdata.find(
+        {"type": metric, "timestamp": {"$gte": cutoff}},
+        {"_id": 0, "userId": 1, "value": 1},
+    ).sort("userId", 1).batch_size(chunk_size)
+
+    summaries = []
+    user_ids, values = [], []
+    for doc in cursor:
+        user_ids.append(doc["userId"])
+        values.append(doc["value"])
+        # Only cut between users so every user is summarized from all readings
+        if len(user_ids) > chunk_size and user_ids[-1] != user_ids[-2]:
+            summaries.append(_summarize_readings(user_ids[:-1], values[:-1]))
+            user_ids, values = user_ids[-1:], values[-1:]
+    if user_ids:
+        summaries.append(_summarize_readings(user_ids, values))
+    return _concat_readings(summaries)
+
+
+def _concat_readings(summaries):
+    if not summaries:
+        return pd.DataFrame(columns=["count", "total", "total_sq"] + TARGET_NAMES)
+    return pd.concat(summaries)
+
+
+def _summarize_readings(user_ids, values):
+    frame = pd.DataFrame({"userId": user_ids, "value": np.asarray(values, dtype=np.float64)})
+    frame["value_sq"] = frame["value"] * frame["value"]
+    grouped = frame.groupby("userId", sort=False)
+    stats = grouped.agg(count=("value", "size"), total=("value", "sum"), total_sq=("value_sq", "sum"))
+    # Linear interpolation, same as np.percentile's default
+    targets = grouped["value"].quantile([0.05, 0.95]).unstack()
+    stats["low_target"] = targets[0.05]
+    stats["high_target"] = targets[0.95]
+    return stats
+
+
+def behavioral_stats(db, cutoff, chunk_size=DEFAULT_CHUNK_SIZE):
+    columns = ["userId", "dietType", "moodType"]
+    if _is_snapshot(db):
+        frames = db.behavioral_logs(cutoff, chunk_size)
+    else:
+        cursor = db.behaviorallogs.find(
+            {"timestamp": {"$gte": cutoff}},
+            {"_id": 0, "userId": 1, "dietType": 1, "moodType": 1},
+        ).batch_size(chunk_size)
+        frames = _frames(cursor, chunk_size, columns)
+    return _count_by_user(frames, lambda frame: {
+        "high_carb_meals": frame["dietType"] == HIGH_CARB_DIET,
+        "stress_events": frame["moodType"] == STRESSED_MOOD,
+    }, columns)
+
+
+def alert_stats(db, metric, cutoff, chunk_size=DEFAULT_CHUNK_SIZE):
+    columns = ["userId", "userFeedback"]
+    if _is_snapshot(db):
+        frames = db.alert_feedback(metric, cutoff, chunk_size)
+    else:
+        cursor = db.alerts.find(
+            {"metricType": metric, "userFeedback": {"$exists": True}, "timestamp": {"$gte": cutoff}},
+            {"_id": 0, "userId": 1, "userFeedback": 1},
+        ).batch_size(chunk_size)
+        frames = _frames(cursor, chunk_size, columns)
+    return _count_by_user(frames, lambda frame: {
+        "false_alarms": frame["userFeedback"] == FALSE_ALARM_FEEDBACK,
+    }, columns)
+
+
+def _frames(cursor, chunk_size, columns):
+    for chunk in _chunks(cursor, chunk_size):
+        yield pd.DataFrame(chunk, columns=columns)
+
+
+def _count_by_user(frames, flags, columns):
+    """Sum boolean flag columns per user, accumulating frame by frame."""
+    totals = None
+    for frame in frames:
+        if frame.empty:
+            continue
+        counts = pd.DataFrame(flags(frame)).astype(np.int64).groupby(frame["userId"]).sum()
+        totals = counts if totals is None else totals.add(counts, fill_value=0)
+    if totals is None:
+        return pd.DataFrame(columns=list(flags(pd.DataFrame(columns=columns))))
+    return totals
+
+
+def _chunks(cursor, chunk_size):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def to_arrays(dataset):
+    """(X, y) float64 arrays in model column order."""
+    return (
+        dataset[FEATURE_NAMES].to_numpy(dtype=np.float64),
+        dataset[TARGET_NAMES].to_numpy(dtype=np.float64),
+    )
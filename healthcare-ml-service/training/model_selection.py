@@ -0,0 +1,102 @@
+"""Capacity sweep: pick the cheapest model to serve that is about as accurate as the best.
+
+Every candidate is fit on the training split and measured on what serving
+pays for it: held-out MSE, pickled size, load time (unpickle + compile,
+as the predictor does) and the compiled forest's single-row and batch
+latency. The selected model is the smallest one whose MSE is within
+``tolerance`` (relative) of the best candidate's.
+"""
+import pickle
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.tree import DecisionTreeRegressor
+
+from app.compiled_forest import CompiledForest
+
+N_ESTIMATORS_GRID = (25, 50, 100)
+MAX_DEPTH_GRID = (6, 10, None)
+# Lighter family: a single tree
+TREE_DEPTH_GRID = (6, 10)
+
+DEFAULT_TOLERANCE = 0.05
+
+# Before the sweep this was the only model trained
+DEFAULT_PARAMS = {"model_type": "RandomForestRegressor", "n_estimators": 100, "max_depth": None}
+
+
+def candidates(n_jobs=None, light=True):
+    """(params, unfitted model) pairs to sweep."""
+    for n_estimators in N_ESTIMATORS_GRID:
+        for max_depth in MAX_DEPTH_GRID:
+            params = {"model_type": "RandomForestRegressor", "n_estimators": n_estimators, "max_depth": max_depth}
+            yield params, build_model(params, n_jobs)
+    if light:
+        for max_depth in TREE_DEPTH_GRID:
+            params = {"model_type": "DecisionTreeRegressor", "n_estimators": 1, "max_depth": max_depth}
+            yield params, build_model(params, n_jobs)
+
+
+def build_model(params, n_jobs=None):
+    if params["model_type"] == "DecisionTreeRegressor":
+        return DecisionTreeRegressor(max_depth=params["max_depth"], random_state=42)
+    return RandomForestRegressor(
+        n_estimators=params["n_estimators"], max_depth=params["max_depth"], random_state=42, n_jobs=n_jobs
+    )
+
+
+def evaluate(model, X_test, y_test, batch_size=1000, repeat=200):
+    """Held-out error plus serving cost of a fitted model."""
+    y_pred = model.predict(X_test)
+    blob = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+
+    started = time.perf_counter()
+    compiled = CompiledForest.from_sklearn(pickle.loads(blob))
+    load_ms = (time.perf_counter() - started) * 1000
+
+    row = np.ascontiguousarray(X_test[:1])
+    batch = np.ascontiguousarray(np.resize(X_test, (batch_size, X_test.shape[1])))
+    return {
+        "mse": float(mean_squared_error(y_test, y_pred)),
+        "r2": float(r2_score(y_test, y_pred)),
+        "size_bytes": len(blob),
+        "load_ms": load_ms,
+        "single_ms": _median_ms(lambda: compiled.predict(row), repeat),
+        "batch_ms": _median_ms(lambda: compiled.predict(batch), max(1, repeat // 20)),
+        "n_nodes": int(len(compiled.left)),
+    }
+
+
+def _median_ms(fn, repeat):
+    fn()  # first call allocates the thread's buffers
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - started
+    return float(np.median(samples) * 1000)
+
+
+def select(results, tolerance=DEFAULT_TOLERANCE):
+    """Index of the smallest result with mse <= best mse * (1 + tolerance).
+
+    Ties on size go to the faster single-row prediction.
+    """
+    best_mse = min(result["mse"] for result in results)
+    eligible = [i for i, result in enumerate(results) if result["mse"] <= best_mse * (1 + tolerance)]
+    return min(eligible, key=lambda i: (results[i]["size_bytes"], results[i]["single_ms"]))
+
+
+def pareto_front(results, objectives=("mse", "size_bytes", "single_ms")):
+    """Indices of results no other result beats on every objective."""
+    front = []
+    for i, result in enumerate(results):
+        dominated = any(
+            all(other[k] <= result[k] for k in objectives) and any(other[k] < result[k] for k in objectives)
+            for j, other in enumerate(results) if j != i
+        )
+        if not dominated:
+            front.append(i)
+    return front
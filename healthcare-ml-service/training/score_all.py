@@ -0,0 +1,71 @@
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app.feature_engineer import FEATURE_NAMES
+from app.indexes import INDEXES
+from app.model_predictor import METRIC_MODELS, ModelPredictor, suggestion_confidence
+from training.build_dataset import build_features, extract_shared
+from training.train_model import get_db
+
+def main(metrics=None, chunk_size=5000, db=None, predictor=None):
+    """Score every user for every metric into the thresholdsuggestions collection.
+
+    Features come from the same single-pass builder as training, each chunk
+    is scored with one call to the model the API currently serves, and the
+    results are bulk-upserted (unordered) keyed by (userId, metric). The API
+    serves these documents until they are PRECOMPUTED_MAX_AGE_HOURS old or
+    a newer model version is promoted. Returns {metric: users scored}.
+    """
+    started = time.perf_counter()
+    metrics = list(metrics or METRIC_MODELS)
+    if db is None:
+        db = get_db()
+    if predictor is None:
+        predictor = ModelPredictor()
+
+    for name, keys, options in INDEXES["thresholdsuggestions"]:
+        db.thresholdsuggestions.create_index(keys, name=name, **options)
+
+    # Taken before any data is read: data arriving during extraction is
+    # newer than computedAt, so the API treats these documents as stale for it
+    computed_at = datetime.utcnow()
+    shared = extract_shared(db)
+    scored = {}
+    for metric in metrics:
+        loaded = predictor.load_model(metric)
+        features = build_features(db, metric, shared=shared)
+        for start in range(0, len(features), chunk_size):
+            chunk = features.iloc[start:start + chunk_size]
+            predictions = loaded.model.predict(chunk[FEATURE_NAMES].to_numpy(dtype=np.float64))
+            confidence = suggestion_confidence(chunk["mean"].to_numpy(), chunk["std"].to_numpy())
+            db.thresholdsuggestions.bulk_write([
+                UpdateOne(
+                    {"userId": user_id, "metric": metric},
+                    {"$set": {
+                        "suggestedThresholds": {"low": float(low), "high": float(high)},
+                        "modelVersion": loaded.run_id,
+                        "registryVersion": str(loaded.version),
+                        "suggestionTimestamp": computed_at.isoformat() + "Z",
+                        "confidence": float(user_confidence),
+                        "computedAt": computed_at,
+                    }},
+                    upsert=True
+                )
+                for user_id, (low, high), user_confidence in zip(chunk.index, predictions, confidence)
+            ], ordered=False)
+        scored[metric] = len(features)
+        print(f"Scored {len(features)} users for {metric} with {loaded.name} version {loaded.version}")
+
+    print(f"Bulk scoring took {time.perf_counter() - started:.1f}s")
+    return scored
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute threshold suggestions for every user")
+    parser.add_argument("--metrics", nargs="+", default=None, help="defaults to every metric the predictor serves")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="users per model call and bulk write")
+    args = parser.parse_args()
+    main(args.metrics, args.chunk_size)
@@ -0,0 +1,240 @@
+"""Columnar snapshots of the training collections, for offline retraining.
+
+    python -m training.snapshot --out-dir snapshots/2024-06-10
+    python -m training.train_model --metric GLUCOSE --snapshot snapshots/2024-06-10
+    python -m training.train_all --snapshot snapshots/2024-06-10
+
+Each collection is streamed once with a projection and written as a
+hive-partitioned dataset: healthdata by type and date, alerts by metricType
+and date, behavioral logs by date. The default format is Arrow IPC (LZ4),
+which is read through memory-mapped files; Parquet (zstd) is smaller on disk
+but must be decoded. Pass ``--compression none`` for zero-copy Arrow reads.
+
+A Snapshot can be passed to training.build_dataset wherever a Mongo database
+is expected, and is scanned in record batches of the builder's chunk size. Its feature windows end at the snapshot time, not at the time
+of training, so replaying a snapshot gives the same dataset.
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from app.feature_store import DAY_MS
+
+MANIFEST = "snapshot.json"
+
+# collection -> (stored fields, partition fields); partition values are
+# directory names, so they are strings
+SCHEMAS = {
+    "users": (
+        pa.schema([("id", pa.string()), ("name", pa.string()), ("age", pa.int64()),
+                   ("allowAutoEscalation", pa.bool_())]),
+        [],
+    ),
+    "healthdata": (
+        pa.schema([("userId", pa.string()), ("timestamp", pa.int64()), ("type", pa.string()),
+                   ("value", pa.float64()), ("unit", pa.string())]),
+        ["type", "date"],
+    ),
+    "behaviorallogs": (
+        pa.schema([("userId", pa.string()), ("timestamp", pa.int64()), ("logType", pa.string()),
+                   ("dietType", pa.string()), ("moodType", pa.string()), ("activityType", pa.string()),
+                   ("durationMinutes", pa.float64()), ("intensity", pa.string())]),
+        ["date"],
+    ),
+    "alerts": (
+        pa.schema([("userId", pa.string()), ("timestamp", pa.int64()), ("metricType", pa.string()),
+                   ("level", pa.string()), ("isDismissed", pa.bool_()), ("userFeedback", pa.string())]),
+        ["metricType", "date"],
+    ),
+}
+
+FORMATS = {
+    "arrow": (ds.IpcFileFormat, "lz4"),
+    "parquet": (ds.ParquetFileFormat, "zstd"),
+}
+
+
+def export(db, out_dir, format="arrow", compression=None, chunk_size=100_000, days=None):
+    """Write every collection in SCHEMAS under out_dir; returns the manifest.
+
+    ``days`` limits the time-stamped collections to the last ``days`` whole
+    days (users are always complete).
+    """
+    as_of_ms = int(time.time() * 1000)
+    file_format, default_compression = FORMATS[format]
+    compression = compression or default_compression
+    file_format = file_format()
+    write_options = file_format.make_write_options(compression=None if compression == "none" else compression)
+    query = {} if days is None else {"timestamp": {"$gte": (as_of_ms // DAY_MS - days) * DAY_MS}}
+
+    counts = {}
+    for collection, (schema, partition_fields) in SCHEMAS.items():
+        started = time.perf_counter()
+        counted = [0]
+        cursor = db[collection].find(
+            {} if collection == "users" else query,
+            {"_id": 0, **{name: 1 for name in schema.names}},
+        ).batch_size(chunk_size)
+        out_schema = schema.append(pa.field("date", pa.string())) if "date" in partition_fields else schema
+        ds.write_dataset(
+            _batches(cursor, schema, out_schema, chunk_size, counted),
+            os.path.join(out_dir, collection),
+            schema=out_schema,
+            format=file_format,
+            file_options=write_options,
+            partitioning=_partitioning(out_schema, partition_fields),
+            existing_data_behavior="delete_matching",
+            max_partitions=100_000,
+            max_rows_per_group=chunk_size,
+        )
+        counts[collection] = counted[0]
+        print(f"{collection}: {counted[0]} documents in {time.perf_counter() - started:.1f}s")
+
+    manifest = {
+        "as_of_ms": as_of_ms,
+        "format": format,
+        "compression": compression,
+        "days": days,
+        "counts": counts,
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _batches(cursor, schema, out_schema, chunk_size, counted):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            yield _record_batch(chunk, schema, out_schema)
+            counted[0] += len(chunk)
+            chunk = []
+    if chunk:
+        yield _record_batch(chunk, schema, out_schema)
+        counted[0] += len(chunk)
+
+
+def _record_batch(docs, schema, out_schema):
+    # Missing fields become nulls; extra fields are dropped
+    batch = pa.RecordBatch.from_pylist(docs, schema=schema)
+    if out_schema is schema:
+        return batch
+    dates = pc.strftime(batch.column("timestamp").cast(pa.timestamp("ms")), format="%Y-%m-%d")
+    return pa.RecordBatch.from_arrays(batch.columns + [dates], schema=out_schema)
+
+
+def _partitioning(schema, fields):
+    if not fields:
+        return None
+    return ds.partitioning(pa.schema([schema.field(name) for name in fields]), flavor="hive")
+
+
+class Snapshot:
+    """Read side of a snapshot: the build_dataset queries, answered from files."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        # Windows end at the snapshot, see build_dataset
+        self.as_of_ms = self.manifest["as_of_ms"]
+        self._format = FORMATS[self.manifest["format"]][0]()
+        self._filesystem = fs.LocalFileSystem(use_mmap=True)
+
+    def dataset(self, collection):
+        schema, partition_fields = SCHEMAS[collection]
+        out_schema = schema.append(pa.field("date", pa.string())) if "date" in partition_fields else schema
+        return ds.dataset(
+            os.path.join(self.path, collection), format=self._format, filesystem=self._filesystem,
+            partitioning=_partitioning(out_schema, partition_fields),
+        )
+
+    def _since(self, cutoff):
+        # The date partitions prune whole directories before the exact filter
+        cutoff_date = time.strftime("%Y-%m-%d", time.gmtime(cutoff // 1000))
+        return (pc.field("date") >= cutoff_date) & (pc.field("timestamp") >= cutoff)
+
+    def users(self):
+        table = self.dataset("users").to_table(columns=["id", "age"])
+        return pd.DataFrame({"userId": table.column("id").to_pylist(), "age": table.column("age").to_pandas()})
+
+    def reading_chunks(self, metric, cutoff, chunk_size):
+        """(userIds, values) of ``metric`` readings since cutoff, in chunks of
+        about chunk_size that each hold every reading of their users.
+
+        Record batches are scanned once and spilled by user group to
+        temporary files as (user index, value) pairs, so memory is bounded
+        by chunk_size and the user list, not by the number of readings.
+        Readings of users not in the snapshot are dropped (they are never
+        scorable).
+        """
+        dataset = self.dataset("healthdata")
+        where = (pc.field("type") == metric) & self._since(cutoff)
+        total = dataset.count_rows(filter=where)
+        if not total:
+            return
+        user_ids = pa.array(self.users()["userId"].drop_duplicates(), type=pa.string())
+        n_groups = -(-total // chunk_size)
+        record = np.dtype([("user", np.int64), ("value", np.float64)])
+
+        with tempfile.TemporaryDirectory(prefix="snapshot-readings-") as tmp:
+            paths = [os.path.join(tmp, f"{group}.bin") for group in range(n_groups)]
+            files = [open(path, "wb") for path in paths]
+            try:
+                for batch in dataset.to_batches(columns=["userId", "value"], filter=where, batch_size=chunk_size):
+                    users = pc.index_in(batch.column("userId"), value_set=user_ids)
+                    known = users.is_valid()
+                    users = users.filter(known).to_numpy(zero_copy_only=False).astype(np.int64)
+                    values = batch.column("value").filter(known).to_numpy(zero_copy_only=False)
+                    groups = users % n_groups
+                    order = np.argsort(groups, kind="stable")
+                    rows = np.empty(len(users), dtype=record)
+                    rows["user"], rows["value"] = users[order], values[order]
+                    bounds = np.searchsorted(groups[order], np.arange(n_groups + 1))
+                    for group in np.flatnonzero(np.diff(bounds)):
+                        files[group].write(rows[bounds[group]:bounds[group + 1]].tobytes())
+            finally:
+                for f in files:
+                    f.close()
+
+            names = user_ids.to_numpy(zero_copy_only=False)
+            for path in paths:
+                rows = np.fromfile(path, dtype=record)
+                if len(rows):
+                    rows = rows[np.argsort(rows["user"], kind="stable")]
+                    yield names[rows["user"]], rows["value"]
+
+    def behavioral_logs(self, cutoff, chunk_size):
+        for batch in self.dataset("behaviorallogs").to_batches(
+                columns=["userId", "dietType", "moodType"], filter=self._since(cutoff), batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    def alert_feedback(self, metric, cutoff, chunk_size):
+        for batch in self.dataset("alerts").to_batches(
+                columns=["userId", "userFeedback"],
+                filter=(pc.field("metricType") == metric) & pc.field("userFeedback").is_valid() & self._since(cutoff),
+                batch_size=chunk_size):
+            yield batch.to_pandas()
+
+if __name__ == "__main__":
+    from training.train_model import get_db
+
+    parser = argparse.ArgumentParser(description="Snapshot the training collections to columnar files")
+    parser.add_argument("--out-dir", required=True)
+    parser.add_argument("--format", choices=list(FORMATS), default="arrow")
+    parser.add_argument("--compression", default=None, help="codec (default: lz4 for arrow, zstd for parquet; 'none' to disable)")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="documents per record batch")
+    parser.add_argument("--days", type=int, default=None, help="only the last N days of time-stamped data")
+    args = parser.parse_args()
+    manifest = export(get_db(), args.out_dir, args.format, args.compression, args.chunk_size, args.days)
+    print(f"Snapshot written to {args.out_dir}: {manifest['counts']}")
@@ -0,0 +1,75 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from app.model_predictor import METRIC_MODELS
+from training.build_dataset import build_dataset, extract_shared, to_arrays
+from training.snapshot import Snapshot
+from training.train_model import get_db, train_and_register
+
+def main(metrics=None, workers=None, n_jobs=None, snapshot=None, tolerance=None, sweep=True):
+    """Train every metric in one invocation.
+
+    Users and behavioral logs are extracted once and reused for every metric;
+    only readings and alert feedback are read per metric. The RandomForest
+    fits then run in parallel worker processes, each logging and registering
+    its own MLflow run. With ``snapshot``, data comes from a
+    training.snapshot directory instead of MongoDB.
+    """
+    started = time.perf_counter()
+    metrics = list(metrics or METRIC_MODELS)
+    if snapshot:
+        db = Snapshot(snapshot)
+    else:
+        db = get_db()
+
+    shared = extract_shared(db)
+    datasets = {}
+    for metric in metrics:
+        dataset = build_dataset(db, metric, shared=shared)
+        if dataset.empty:
+            print(f"No data found for metric {metric}. Skipping training.")
+            continue
+        datasets[metric] = to_arrays(dataset)
+        print(f"Built dataset for {metric}: {len(dataset)} users")
+    print(f"Data extraction took {time.perf_counter() - started:.1f}s")
+
+    if not datasets:
+        return {}
+
+    # Split the cores between concurrent fits unless told otherwise
+    workers = workers or len(datasets)
+    n_jobs = n_jobs or max(1, (os.cpu_count() or 1) // workers)
+
+    failures = {}
+    # spawn: workers must not inherit the parent's MongoClient threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        futures = {
+            pool.submit(train_and_register, metric, X, y, n_jobs, snapshot, tolerance, sweep): metric
+            for metric, (X, y) in datasets.items()
+        }
+        for future in as_completed(futures):
+            metric = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures[metric] = str(e)
+                print(f"Training failed for {metric}: {e}")
+
+    print(f"Trained {len(datasets) - len(failures)}/{len(datasets)} metrics "
+          f"in {time.perf_counter() - started:.1f}s ({workers} workers, n_jobs={n_jobs})")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train all threshold models in one run")
+    parser.add_argument("--metrics", nargs="+", default=None, help="defaults to every metric the predictor serves")
+    parser.add_argument("--workers", type=int, default=None, help="parallel fits (default: one per metric)")
+    parser.add_argument("--n-jobs", type=int, default=None, help="RandomForest n_jobs per fit (default: cores / workers)")
+    parser.add_argument("--snapshot", default=None, help="train from a training.snapshot directory instead of MongoDB")
+    parser.add_argument("--tolerance", type=float, default=None, help="relative MSE slack for picking a smaller model")
+    parser.add_argument("--no-sweep", action="store_true", help="fit only the default 100-tree forest")
+    args = parser.parse_args()
+    if main(args.metrics, args.workers, args.n_jobs, args.snapshot, args.tolerance, not args.no_sweep):
+        raise SystemExit(1)
@@ -1,89 +1,60 @@
 import os
 import mlflow
 import mlflow.sklearn
-import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
+from mlflow.tracking import MlflowClient
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from datetime import datetime, timedelta
 import argparse
 
+from app.feature_engineer import FEATURE_NAMES
+from training.build_dataset import build_dataset, to_arrays
+from training.snapshot import Snapshot
+from training.model_selection import (
+    DEFAULT_PARAMS, DEFAULT_TOLERANCE, build_model, candidates, evaluate, pareto_front, select,
+)
+
 # Load environment variables
 load_dotenv()
 
-# Connect to MongoDB
-client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
-db = client["healthcompanion"]
+def get_db():
+    # Connect to MongoDB
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    return client["healthcompanion"]
 
-def main(metric: str):
-    # Set up MLflow
-    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5008"))
-    mlflow.set_experiment(f"threshold_{metric}")
-    
-    # Collect data
-    dataset = []
-    users = db.users.find({})
+def main(metric: str, db=None, snapshot=None, tolerance=None, sweep=True):
+    if snapshot:
+        # Offline: read a training.snapshot export instead of Mongo
+        db = Snapshot(snapshot)
+    elif db is None:
+        db = get_db()
     
-    for user in users:
-        user_id = user["id"]
-        
-        # Get health data
-        cutoff = datetime.now() - timedelta(days=30)
-        health_data = list(db.healthdata.find({
-            "userId": user_id,
-            "type": metric,
-            "timestamp": {"$gte": cutoff.timestamp() * 1000}
-        }))
-        
-        if not health_data:
-            continue
-            
-        # Get behavioral logs
-        behavioral_logs = list(db.behaviorallogs.find({
-            "userId": user_id,
-            "timestamp": {"$gte": cutoff.timestamp() * 1000}
-        }))
-        
-        # Get alert feedback
-        alerts = list(db.alerts.find({
-            "userId": user_id,
-            "metricType": metric,
-            "userFeedback": {"$exists": True},
-            "timestamp": {"$gte": cutoff.timestamp() * 1000}
-        }))
-        
-        # Create features
-        values = [d['value'] for d in health_data]
-        features = {
-            "age": user.get("age", 50),
-            "mean": np.mean(values),
-            "std": np.std(values),
-            "false_alarms": sum(1 for a in alerts if a.get("userFeedback") == "DISMISSED_FALSE_ALARM"),
-            "high_carb_meals": sum(1 for log in behavioral_logs 
-                                  if log.get("dietType") == "High Carb Meal"),
-            "stress_events": sum(1 for log in behavioral_logs 
-                                if log.get("moodType") == "Stressed"),
-        }
-        
-        # Use percentiles as targets
-        low_target = np.percentile(values, 5)  # 5th percentile
-        high_target = np.percentile(values, 95)  # 95th percentile
-        
-        dataset.append({
-            "features": list(features.values()),
-            "target": [low_target, high_target]
-        })
+    # Collect data: one streamed, vectorized pass per collection, with the
+    # same feature definitions and windows the predictor serves
+    dataset = build_dataset(db, metric)
     
-    if not dataset:
+    if dataset.empty:
         print(f"No data found for metric {metric}. Skipping training.")
         return
     
     # Prepare data
-    X = np.array([d["features"] for d in dataset])
-    y = np.array([d["target"] for d in dataset])
+    X, y = to_arrays(dataset)
+    print(f"Built dataset for {metric}: {len(X)} users")
+    train_and_register(metric, X, y, snapshot=snapshot, tolerance=tolerance, sweep=sweep)
+
+def train_and_register(metric: str, X, y, n_jobs=None, snapshot=None, tolerance=None, sweep=True):
+    """Fit, evaluate, log and register one metric's model in its own MLflow run.
+
+    With ``sweep``, every training.model_selection candidate is fit and
+    logged as a nested run, and the smallest one within ``tolerance``
+    (MODEL_ERROR_TOLERANCE, relative to the best held-out MSE) is registered.
+    Needs no database access, so it can run in a worker process.
+    """
+    # Set up MLflow
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5008"))
+    mlflow.set_experiment(f"threshold_{metric}")
+    if tolerance is None:
+        tolerance = float(os.getenv("MODEL_ERROR_TOLERANCE", str(DEFAULT_TOLERANCE)))
     
     # Split data with handling for small datasets
     if len(X) > 1:
@@ -92,42 +63,50 @@ def main(metric: str):
         # Use all data for training when we have only one sample
         X_train, y_train = X, y
         X_test, y_test = X, y
-    
-    # Train model
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    
-    # Evaluate
-    y_pred = model.predict(X_test)
-    mse = mean_squared_error(y_test, y_pred)
-    r2 = r2_score(y_test, y_pred)
+    can_evaluate = len(X_test) >= 2
     
     # Log to MLflow
     with mlflow.start_run() as run:
         run_id = run.info.run_id
         
+        params = DEFAULT_PARAMS
+        if sweep and can_evaluate:
+            params = sweep_capacity(metric, X_train, y_train, X_test, y_test, n_jobs, tolerance)
+        
+        # Refit rather than keep every candidate in memory; random_state
+        # makes it the same model
+        model = build_model(params, n_jobs)
+        model.fit(X_train, y_train)
+        
         mlflow.log_params({
-            "model_type": "RandomForestRegressor",
-            "n_estimators": 100,
-            "metric": metric
+            **params,
+            "n_jobs": n_jobs,
+            "metric": metric,
+            "error_tolerance": tolerance
         })
+        if snapshot:
+            mlflow.log_param("data_snapshot", snapshot)
         
         # Only evaluate if we have enough samples
-        if len(X_test) >= 2:
-            y_pred = model.predict(X_test)
-            mse = mean_squared_error(y_test, y_pred)
-            r2 = r2_score(y_test, y_pred)
-            mlflow.log_metrics({"mse": mse, "r2": r2})
-            print(f"Evaluation metrics: MSE={mse:.4f}, R²={r2:.4f}")
+        if can_evaluate:
+            result = evaluate(model, X_test, y_test)
+            mlflow.log_metrics(result)
+            print(f"Evaluation metrics: MSE={result['mse']:.4f}, R²={result['r2']:.4f}, "
+                  f"{result['size_bytes'] / 1024:.0f} KiB, single {result['single_ms']:.3f}ms")
         else:
             print("Skipping evaluation due to insufficient test samples")
             mlflow.log_metric("r2", 0.0)  # Default value
         
-        mlflow.sklearn.log_model(model, "model")
+        # cloudpickle (the MLflow 2.x default) so the API can load the native
+        # estimator; MLflow 3's skops default refuses sklearn's tree types
+        mlflow.sklearn.log_model(
+            model, "model",
+            serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE
+        )
         
         # Print and log feature importances
         importances = model.feature_importances_
-        feature_names = list(features.keys())
+        feature_names = FEATURE_NAMES
         for name, importance in zip(feature_names, importances):
             mlflow.log_metric(f"feature_{name}_importance", importance)
             print(f"{name}: {importance:.4f}")
@@ -137,6 +116,11 @@ def main(metric: str):
     try:
         registered_model = mlflow.register_model(model_uri, f"threshold_{metric}")
         print(f"Registered model '{registered_model.name}' version {registered_model.version}")
+        # Promote to the alias the service follows; its poller picks it up
+        alias = os.getenv("MODEL_ALIAS", "champion")
+        if alias != "latest":
+            MlflowClient().set_registered_model_alias(registered_model.name, alias, registered_model.version)
+            print(f"Set alias '{alias}' -> version {registered_model.version}")
     except Exception as e:
         print(f"Model registration failed: {e}")
         # Fallback to log model as artifact
@@ -145,8 +129,44 @@ def main(metric: str):
 
     print(f"Training completed for {metric}")
 
+def sweep_capacity(metric, X_train, y_train, X_test, y_test, n_jobs, tolerance):
+    """Fit and measure every candidate as a nested run; returns the selected params."""
+    results = []
+    for params, candidate in candidates(n_jobs):
+        candidate.fit(X_train, y_train)
+        result = evaluate(candidate, X_test, y_test)
+        with mlflow.start_run(run_name=_candidate_name(params), nested=True):
+            mlflow.log_params({**params, "metric": metric})
+            mlflow.log_metrics(result)
+        results.append({**params, **result})
+        print(f"{_candidate_name(params)}: MSE={result['mse']:.4f}, {result['size_bytes'] / 1024:.0f} KiB, "
+              f"load {result['load_ms']:.1f}ms, single {result['single_ms']:.3f}ms, batch {result['batch_ms']:.2f}ms")
+
+    chosen = select(results, tolerance)
+    front = pareto_front(results)
+    # The report: every candidate, flagged if on the error/size/latency front
+    mlflow.log_dict({
+        "tolerance": tolerance,
+        "objectives": ["mse", "size_bytes", "single_ms"],
+        "candidates": [
+            {**result, "pareto": i in front, "selected": i == chosen}
+            for i, result in enumerate(results)
+        ],
+    }, "capacity_sweep.json")
+    print(f"Selected {_candidate_name(results[chosen])} (tolerance {tolerance:.0%}); "
+          f"Pareto front: {', '.join(_candidate_name(results[i]) for i in front)}")
+    return {key: results[chosen][key] for key in DEFAULT_PARAMS}
+
+def _candidate_name(params):
+    if params["model_type"] == "DecisionTreeRegressor":
+        return f"tree_depth{params['max_depth']}"
+    return f"rf{params['n_estimators']}_depth{params['max_depth']}"
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--metric", type=str, required=True)
+    parser.add_argument("--snapshot", type=str, default=None, help="train from a training.snapshot directory instead of MongoDB")
+    parser.add_argument("--tolerance", type=float, default=None, help="relative MSE slack for picking a smaller model (default: MODEL_ERROR_TOLERANCE or 0.05)")
+    parser.add_argument("--no-sweep", action="store_true", help="fit only the default 100-tree forest")
     args = parser.parse_args()
-    main(args.metric)
+    main(args.metric, snapshot=args.snapshot, tolerance=args.tolerance, sweep=not args.no_sweep)
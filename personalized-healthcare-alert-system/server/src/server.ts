@@ -15,7 +15,7 @@ import {
 import { HealthMetricType } from './types'; // Import HealthMetricType
 import { getAlertExplanationFromServer } from './services/geminiService';
 import { assessSingleDataPointRiskOnServer } from './services/healthLogicService';
-import { fetchPersonalizedThresholds } from './services/mlService'; // NEW IMPORT
+import { fetchPersonalizedThresholdsBatch } from './services/mlService'; // NEW IMPORT
 import { 
     connectToMongoDB, 
     getUserData, 
@@ -82,8 +82,10 @@ app.post('/api/healthdata', async (req: Request, res: Response) => {
 
     if (shouldUpdateThresholds) {
       // Fetch personalized thresholds for relevant metrics
-      const newGlucoseThresholds = await fetchPersonalizedThresholds(currentUserInDB.id, HealthMetricType.GLUCOSE);
-      const newHeartRateThresholds = await fetchPersonalizedThresholds(currentUserInDB.id, HealthMetricType.HEART_RATE);
+      const [newGlucoseThresholds, newHeartRateThresholds] = await fetchPersonalizedThresholdsBatch([
+        { userId: currentUserInDB.id, metric: HealthMetricType.GLUCOSE },
+        { userId: currentUserInDB.id, metric: HealthMetricType.HEART_RATE },
+      ]);
 
       // Apply updates if new thresholds are returned
       if (newGlucoseThresholds) {
@@ -20,3 +20,20 @@ export const fetchPersonalizedThresholds = async (
     return null; 
   }
 };
+
+
+export const fetchPersonalizedThresholdsBatch = async (
+  requests: { userId: string; metric: HealthMetricType }[]
+): Promise<({ low: number; high: number } | null)[]> => {
+  try {
+    const response = await axios.post(
+      `${ML_SERVICE_BASE_URL}/ml/personalized_thresholds:batch`,
+      { requests }
+    );
+    // Results come back in the same order as the requests
+    return response.data.results.map((result: any) => result.suggestedThresholds);
+  } catch (error) {
+    console.error(`Error fetching personalized thresholds batch for ${requests.length} requests:`, error);
+    return requests.map(() => null);
+  }
+};